@@ -0,0 +1,105 @@
+import asyncio
+import random
+import socket
+import threading
+from typing import List
+
+
+class FakeProxyFarm:
+    """本地假代理集群：在一个后台事件循环中监听多个端口，模拟不同延迟与失败率的HTTP代理"""
+
+    def __init__(self, count: int = 500, latency: float = 0.2, jitter: float = 0.5, failure_rate: float = 0.7,
+                 keyword: str = "Success", seed: int = 0, hang_ratio: float = 0.0):
+        """
+        :param count: 代理数量
+        :param latency: 存活代理的平均响应延迟（秒）
+        :param jitter: 延迟抖动比例（实际延迟在 latency*(1±jitter) 内均匀分布）
+        :param failure_rate: 失效代理比例（其中一半端口拒绝连接，一半能连通但返回错误内容）
+        :param keyword: 存活代理响应中包含的验证关键词
+        :param seed: 随机种子（保证多次运行的代理分布一致）
+        :param hang_ratio: 能连通的失效代理中，接受连接后一直不响应的比例（模拟拖满超时的代理）
+        """
+        self.count = count
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.keyword = keyword
+        self.hang_ratio = hang_ratio
+        self.proxies = []  # 全部代理（IP:PORT）
+        self.alive_proxies = set()  # 预期验证通过的代理
+        self._random = random.Random(seed)
+        self._loop = None
+        self._thread = None
+        self._servers = []
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, delay: float,
+                      alive: bool, hang: bool = False) -> None:
+        """内部方法：读取请求头后按配置延迟返回响应（hang 时不响应，直到客户端断开）"""
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            if hang:
+                await reader.read()
+                return
+            await asyncio.sleep(delay)
+            body = f"<HTML><BODY>{self.keyword if alive else 'Forbidden'}</BODY></HTML>".encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nContent-Length: %d\r\n"
+                         b"Connection: close\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass  # 客户端断开，或集群关闭时取消仍挂起的连接
+        finally:
+            writer.close()
+
+    async def _start_servers(self) -> None:
+        """内部方法：为每个代理分配端口（存活/返回错误内容的代理监听端口，拒绝连接的代理只占用端口号）"""
+        reserved = []  # 全部端口分配完后再释放，避免被后续监听端口复用
+        for _ in range(self.count):
+            roll = self._random.random()
+            if roll < self.failure_rate / 2:
+                # 仅绑定不监听：该端口上无服务，连接会被拒绝
+                sock = socket.socket()
+                sock.bind(("127.0.0.1", 0))
+                reserved.append(sock)
+                self.proxies.append(f"127.0.0.1:{sock.getsockname()[1]}")
+                continue
+            alive = roll >= self.failure_rate
+            hang = not alive and self.hang_ratio > 0 and self._random.random() < self.hang_ratio
+            delay = self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+            server = await asyncio.start_server(
+                lambda r, w, d=delay, a=alive, h=hang: self._handle(r, w, d, a, h), "127.0.0.1", 0, backlog=1024)
+            port = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+            proxy = f"127.0.0.1:{port}"
+            self.proxies.append(proxy)
+            if alive:
+                self.alive_proxies.add(proxy)
+        for sock in reserved:
+            sock.close()
+
+    def start(self) -> List[str]:
+        """启动集群，返回全部代理列表"""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start_servers(), self._loop).result()
+        return self.proxies
+
+    def stop(self) -> None:
+        """关闭全部监听端口并停止事件循环"""
+
+        async def close_all() -> None:
+            for server in self._servers:
+                server.close()
+            # 结束仍挂起的连接处理（不响应的代理）
+            handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in handlers:
+                task.cancel()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            for server in self._servers:
+                await server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(close_all(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._servers = []
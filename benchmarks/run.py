@@ -0,0 +1,146 @@
+"""
+离线性能基准：解析器吞吐（页/秒）、候选去重吞吐（个/秒）、验证器吞吐（代理/秒）
+用法（在项目根目录执行）：python -m benchmarks.run [--only parsers,dedup,validator]
+"""
+import argparse
+import os
+import random
+import time
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fake_proxy_farm import FakeProxyFarm
+from utils.candidates import CandidateSet, CandidateStore, pack_proxies
+from utils.crawler import ProxyCrawler
+from utils.validator import ProxyValidator
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# 解析器 -> 保存的响应样本
+PARSER_FIXTURES = {
+    "api1": "api1.txt",
+    "api2": "api2.json",
+    "article1": "article1.html",
+    "html1": "html1.html",
+    "html2": "html2.html",
+    "html3": "html3.html",
+    "html4": "html4.html",
+    "fpslist": "fpslist.html",
+    "fineproxy": "fineproxy.json",
+}
+
+
+def measure(func: Callable[[], object], min_seconds: float) -> Dict[str, float]:
+    """重复执行 func 至少 min_seconds 秒，返回执行次数与总耗时"""
+    func()  # 预热
+    runs = 0
+    start_time = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds:
+        func()
+        runs += 1
+        elapsed = time.perf_counter() - start_time
+    return {"runs": runs, "elapsed": elapsed}
+
+
+def bench_parsers(min_seconds: float) -> None:
+    """各解析器对保存的响应样本的解析速度"""
+    print(f"\n{'=' * 70}")
+    print("📄 解析器吞吐（保存的响应样本）")
+    print(f"{'=' * 70}")
+    print(f"   {'解析器':<10}{'样本大小':>10}{'提取IP':>8}{'页/秒':>12}{'IP/秒':>14}")
+    for parser_name, filename in PARSER_FIXTURES.items():
+        with open(os.path.join(FIXTURE_DIR, filename), "r", encoding="utf-8") as f:
+            html = f.read()
+        parser = getattr(ProxyCrawler, f"parse_{parser_name}")
+        ip_count = len(parser(html))
+        result = measure(lambda: parser(html), min_seconds)
+        pages_per_sec = result["runs"] / result["elapsed"]
+        print(f"   {parser_name:<12}{len(html) / 1024:>8.1f}KB{ip_count:>8d}{pages_per_sec:>12.1f}"
+              f"{pages_per_sec * ip_count:>14.0f}")
+
+
+def random_candidates(count: int, duplicate_rate: float, seed: int = 0) -> List[str]:
+    """生成带重复的候选代理字符串（模拟多源重复发布）"""
+    rng = random.Random(seed)
+    unique_count = max(1, int(count * (1 - duplicate_rate)))
+    pool = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}:"
+            f"{rng.randint(1, 65535)}" for _ in range(unique_count)]
+    return [pool[i] if i < unique_count else rng.choice(pool) for i in range(count)]
+
+
+def bench_dedup(count: int, duplicate_rate: float, min_seconds: float) -> None:
+    """候选代理校验打包 + 去重 + 跨类型集合运算的速度"""
+    candidates = random_candidates(count, duplicate_rate)
+    half = len(candidates) // 2
+    normal, anonymous = CandidateStore.from_proxies(candidates[:half]), CandidateStore.from_proxies(candidates[half:])
+
+    print(f"\n{'=' * 70}")
+    print(f"🔍 候选去重吞吐（{count} 个候选，重复率约 {duplicate_rate * 100:.0f}%）")
+    print(f"{'=' * 70}")
+    cases = {
+        "校验+打包": lambda: pack_proxies(candidates),
+        "打包+去重": lambda: CandidateStore(pack_proxies(candidates)).unique(),
+        "流式去重": lambda: CandidateSet().add_new(pack_proxies(candidates)),
+        "跨类型交集": lambda: normal.intersection(anonymous),
+        "还原字符串": lambda: normal.to_list(),
+    }
+    for name, func in cases.items():
+        result = measure(func, min_seconds)
+        per_sec = result["runs"] * count / result["elapsed"]
+        print(f"   {name:<10}{per_sec:>16,.0f} 个/秒")
+
+
+def bench_validator(count: int, latency: float, failure_rate: float, thread_count: int, timeout: float,
+                    hang_ratio: float = 0.0, adaptive: bool = True, budget: Optional[float] = None) -> None:
+    """对本地假代理集群做完整验证（TCP预筛 + HTTP关键词验证）"""
+    farm = FakeProxyFarm(count=count, latency=latency, failure_rate=failure_rate, hang_ratio=hang_ratio)
+    proxies = farm.start()
+    try:
+        print(f"\n{'=' * 70}")
+        print(f"🔍 验证器吞吐（假代理 {count} 个 | 平均延迟 {latency * 1000:.0f}ms | 失效率 {failure_rate * 100:.0f}% | "
+              f"线程数 {thread_count} | 不响应 {hang_ratio * 100:.0f}% | 自适应超时 {'开' if adaptive else '关'}"
+              f"{f' | 预算 {budget:.0f}秒' if budget else ''}）")
+        print(f"{'=' * 70}")
+        validator = ProxyValidator(timeout=timeout, adaptive_percentile=0.95 if adaptive else None)
+        start_time = time.perf_counter()
+        valid_proxies = validator.validate(proxies, "http://captive.apple.com/", "Success", thread_count, budget)
+        elapsed = time.perf_counter() - start_time
+        missed = len(farm.alive_proxies - set(valid_proxies))
+        print(f"   ├─ 耗时：{elapsed:.2f} 秒")
+        print(f"   ├─ 有效：{len(valid_proxies)} 个（预期 {len(farm.alive_proxies)} 个，漏判 {missed} 个）")
+        print(f"   ├─ 最终超时：{validator.current_timeout():.2f} 秒"
+              f" | 预算用尽取消：{len(validator.cancelled_proxies) - validator.expired_count} 个"
+              f" | 自适应超时截断：{validator.expired_count} 个")
+        print(f"   └─ 吞吐：{count / elapsed:,.1f} 代理/秒")
+    finally:
+        farm.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FreeProxyPool 离线性能基准")
+    parser.add_argument("--only", default="parsers,dedup,validator", help="运行的基准项，逗号分隔")
+    parser.add_argument("--seconds", type=float, default=1.0, help="每个解析/去重用例的最短运行时间（秒）")
+    parser.add_argument("--candidates", type=int, default=100000, help="去重基准的候选数量")
+    parser.add_argument("--duplicate-rate", type=float, default=0.3, help="去重基准的重复率")
+    parser.add_argument("--proxies", type=int, default=1000, help="假代理数量")
+    parser.add_argument("--latency", type=float, default=0.2, help="假代理平均延迟（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.7, help="假代理失效比例")
+    parser.add_argument("--threads", type=int, default=200, help="验证线程数")
+    parser.add_argument("--timeout", type=float, default=5, help="验证超时（秒，自适应超时的上限）")
+    parser.add_argument("--hang-ratio", type=float, default=0.0, help="能连通的失效代理中一直不响应的比例")
+    parser.add_argument("--fixed-timeout", action="store_true", help="关闭自适应超时")
+    parser.add_argument("--budget", type=float, default=None, help="验证时间预算（秒）")
+    args = parser.parse_args()
+
+    only = set(args.only.split(","))
+    if "parsers" in only:
+        bench_parsers(args.seconds)
+    if "dedup" in only:
+        bench_dedup(args.candidates, args.duplicate_rate, args.seconds)
+    if "validator" in only:
+        bench_validator(args.proxies, args.latency, args.failure_rate, args.threads, args.timeout, args.hang_ratio,
+                        not args.fixed_timeout, args.budget)
+
+
+if __name__ == "__main__":
+    main()
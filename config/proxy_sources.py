@@ -3,8 +3,13 @@
 # url: 代理列表基础URL（分页参数留空或占位）
 # body: POST请求数据（可选，为空则使用GET请求）
 # parser: 解析方法（对应crawler中的parse_*方法）
-# pages: 爬取页数（固定数值/auto自动识别，api2方法专属）
-# delay: 分页请求延迟（秒，防反爬）
+# pages: 爬取页数（固定数值/auto自动识别：api2读取接口返回的总页数，HTML源从第1页的分页链接嗅探）
+# delay: 同一主机相邻请求的最小间隔（秒，防反爬；各代理源之间并发爬取）
+# concurrency: 第1页之后同时请求的页数（可选，默认4；请求发起间隔仍受 delay 约束）
+# max_pages: HTML源 auto 嗅探的页数上限（可选，默认50）
+# interval: 该源的刷新间隔（可选，秒，默认使用启动时输入的刷新间隔）
+# adaptive: 是否自适应刷新间隔（可选：上次无新代理时间隔翻倍，新代理占比过半时减半）
+# min_interval / max_interval: 自适应间隔的上下限（可选，秒，默认 interval 的1/4与4倍）
 
 # 普通代理源（透明代理/普通匿名代理）
 NORMAL_PROXIES = [
@@ -117,6 +122,8 @@ NORMAL_PROXIES = [
         "parser": "api1",
         "pages": 1,
         "delay": 1,
+        "interval": 15 * 60,  # 列表更新频繁，单独按15分钟刷新
+        "adaptive": True,
     }
 ]
 
@@ -217,6 +224,8 @@ ANONYMOUS_PROXIES = [
         "parser": "api1",
         "pages": 1,
         "delay": 1,
+        "interval": 15 * 60,  # 列表更新频繁，单独按15分钟刷新
+        "adaptive": True,
     },
     {
         "name": "OpenProxyList(高匿)",
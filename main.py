@@ -1,31 +1,186 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
 import time
+from typing import Dict, List, Optional, Tuple
 
 from config.proxy_sources import NORMAL_PROXIES, ANONYMOUS_PROXIES
-from utils.crawler import ProxyCrawler
-from utils.storage import ProxyStorage
+from utils import metrics
+from utils.api import ProxyApiServer, ProxyIndex
+from utils.candidates import CandidateStore
+from utils.crawler import HostRateLimiter, ProxyCrawler
+from utils.history import ProxyHistory
+from utils.lease import ProxyLeasePool
+from utils.page_cache import PageCache
+from utils.scheduler import SourceScheduler
+from utils.source_health import SourceHealth
+from utils.storage import GEO_FIELDS, METRIC_FIELDS, ProxyChangeFeed, ProxyDatabase, ProxyStorage
 from utils.validator import ProxyValidator
 
+PROXY_TYPES = ("all", "normal", "anonymous")
 
-def main():
-    # 输入交互
+# 运行参数默认值（优先级：命令行参数 > 配置文件 > 默认值）
+DEFAULT_OPTIONS = {
+    "interval": 2,  # 代理源默认刷新间隔（小时），代理源可单独配置 interval
+    "type": "all",  # 爬取的代理类型：all=全部 / normal=普通 / anonymous=高匿
+    "threads": 200,  # 验证线程数（分片模式下为每个分片的线程数）
+    "recheck": 30,  # 有效代理复检间隔（分钟），与代理源刷新相互独立
+    "budget": 10 * 60,  # 每轮验证的时间预算（秒，从本轮开始计算），用尽后取消未完成的验证；0 为不限制
+    "shards": 0,  # 分片验证的分片数：0 为单进程流式验证；>0 时爬取结束后按哈希分片，由多个进程/节点并行验证
+    "shard_workers": os.cpu_count() or 1,  # 本机分片工作进程数（为0时仅由其他节点执行 python -m utils.sharding）
+    "api_host": "127.0.0.1",  # 本地代理查询服务监听地址
+    "api_port": 5010,
+    "metrics_file": "metrics.prom",  # 每轮结束写入的 Prometheus 指标文件（同时可通过 /metrics 拉取）
+    "test_url": "http://captive.apple.com/",  # 验证URL（开启 classify 时须为回显接口，可自建：python -m utils.echo_server）
+    "keyword": "Success",  # 验证成功关键词（开启 classify 且未指定时为回显接口响应中的 origin）
+    "classify": False,  # 按回显结果判断匿名度（同一次验证请求），代替代理源标注的类型
+    "geo_db": None,  # 本地IP段数据库（CSV/TSV，如 ip2asn-v4.tsv.gz），设置后为有效代理补充国家/ASN
+    "once": False  # 只运行一轮后退出（一次性任务/定时任务）
+}
+# 配置文件参数按默认值的类型校验，以下两类单独处理
+INTEGER_OPTIONS = ("threads", "shards", "shard_workers", "api_port")  # 只接受整数的数值参数
+OPTIONAL_OPTIONS = ("geo_db",)  # 可为 null 的字符串参数
+
+
+def check_option_type(key: str, value) -> Optional[str]:
+    """配置文件参数类型与默认值不一致时返回错误说明"""
+    default = DEFAULT_OPTIONS[key]
+    if key in OPTIONAL_OPTIONS:
+        valid, expected = value is None or isinstance(value, str), "字符串或 null"
+    elif isinstance(default, bool):
+        valid, expected = isinstance(value, bool), "true/false"
+    elif key in INTEGER_OPTIONS:
+        valid, expected = isinstance(value, int) and not isinstance(value, bool), "整数"
+    elif isinstance(default, (int, float)):
+        valid, expected = isinstance(value, (int, float)) and not isinstance(value, bool), "数字"
+    else:
+        valid, expected = isinstance(value, str), "字符串"
+    return None if valid else f"{key} 须为{expected}（当前为 {json.dumps(value, ensure_ascii=False)}）"
+
+
+def parse_options(argv: Optional[List[str]] = None) -> Dict:
+    """解析命令行参数与配置文件，返回运行参数（不带任何参数且在终端中运行时标记为交互配置）"""
+    parser = argparse.ArgumentParser(description="FreeProxyPool 代理IP爬取验证（不带参数在终端运行时进入配置向导）")
+    parser.add_argument("--config", help="JSON 配置文件（键为下列参数的长名称，连字符换成下划线）")
+    parser.add_argument("--interval", type=float, help="代理源默认刷新间隔（小时，默认2）")
+    parser.add_argument("--type", choices=PROXY_TYPES, help="爬取的代理类型（默认all）")
+    parser.add_argument("--threads", type=int, help="验证线程数（默认200）")
+    parser.add_argument("--recheck", type=float, help="有效代理复检间隔（分钟，默认30）")
+    parser.add_argument("--budget", type=float, help="每轮验证时间预算（秒，0为不限制，默认600）")
+    parser.add_argument("--shards", type=int, help="分片验证的分片数（默认0，不分片）")
+    parser.add_argument("--shard-workers", type=int, help="本机分片工作进程数（默认CPU核数）")
+    parser.add_argument("--api-host", help="代理API监听地址（默认127.0.0.1）")
+    parser.add_argument("--api-port", type=int, help="代理API监听端口（默认5010）")
+    parser.add_argument("--metrics-file", help="Prometheus 指标文件（默认metrics.prom）")
+    parser.add_argument("--test-url", help="验证URL（默认 http://captive.apple.com/）")
+    parser.add_argument("--keyword", help="验证成功关键词（默认Success，开启 --classify 时默认origin）")
+    parser.add_argument("--classify", action="store_true", default=None,
+                        help="按回显结果判断匿名度（需用 --test-url 指向回显接口），代替代理源标注的类型")
+    parser.add_argument("--geo-db", help="本地IP段数据库（CSV/TSV，可带.gz），为有效代理补充国家/ASN")
+    parser.add_argument("--once", action="store_true", default=None, help="只运行一轮后退出")
+    argv = sys.argv[1:] if argv is None else argv
+    args = parser.parse_args(argv)
+
+    options = dict(DEFAULT_OPTIONS)
+    file_options = {}
+    if args.config:
+        try:
+            with open(args.config, "r", encoding="utf-8") as f:
+                file_options = json.load(f)
+        except (OSError, ValueError) as e:
+            parser.error(f"配置文件读取失败：{e}")
+        unknown = sorted(set(file_options) - set(DEFAULT_OPTIONS))
+        if unknown:
+            parser.error(f"配置文件包含未知参数：{', '.join(unknown)}")
+        errors = [error for error in (check_option_type(key, value) for key, value in file_options.items()) if error]
+        if errors:
+            parser.error(f"配置文件参数类型错误：{'；'.join(errors)}")
+        if file_options.get("type", "all") not in PROXY_TYPES:
+            parser.error("配置文件中的 type 仅支持 all/normal/anonymous")
+        options.update(file_options)
+    cli_options = {key: value for key, value in vars(args).items() if key != "config" and value is not None}
+    options.update(cli_options)
+    if options["classify"]:
+        if options["test_url"] == DEFAULT_OPTIONS["test_url"]:
+            parser.error("--classify 需用 --test-url 指向回显接口（如自建的 python -m utils.echo_server）")
+        if "keyword" not in file_options and "keyword" not in cli_options:
+            options["keyword"] = "origin"  # 回显接口响应中必有的字段
+    if options["shards"] and not options["shard_workers"] and not options["budget"]:
+        parser.error("--shard-workers 为0（仅由其他节点验证）时须设置 --budget，否则其他节点不在线时会一直等待")
+    options["interactive"] = not argv and sys.stdin.isatty()
+    return options
+
+
+def ask_options(options: Dict) -> None:
+    """交互配置向导：输入刷新间隔与代理类型（直接回车使用默认值）"""
     print("=" * 60)
     print("📌 代理IP爬取验证程序 - 配置向导")
     print("=" * 60)
-    check_hours = input("请输入代理循环检查间隔时间（小时，默认2h）：").strip()
-    check_hours = int(check_hours) if check_hours and check_hours.isdigit() else 2
-    check_interval = check_hours * 3600
+    check_hours = input("请输入代理源默认刷新间隔时间（小时，默认2h）：").strip()
+    options["interval"] = int(check_hours) if check_hours and check_hours.isdigit() else options["interval"]
 
     # 代理类型选择
     proxy_type = input("请选择爬取的代理类型（all-全部/normal-普通/anonymous-高匿，默认all）：").strip().lower() or "all"
-    while proxy_type not in ["all", "normal", "anonymous"]:
+    while proxy_type not in PROXY_TYPES:
         print("❌ 错误：仅支持 all/normal/anonymous 三种输入！")
         proxy_type = input("请重新输入代理类型：").strip().lower() or "all"
+    options["type"] = proxy_type
+
+
+async def crawl_sources(jobs: List[Tuple[ProxyCrawler, List[dict]]]) -> None:
+    """在同一事件循环中并发爬取所有代理源"""
+    limiter = HostRateLimiter()
+    await asyncio.gather(*(crawler.crawl_all_async(sources, limiter) for crawler, sources in jobs))
 
-    thread_count = 200  # 线程数可适当调整
+
+def record_round_metrics(checked_proxies: List[str], valid_proxies: List[str], proxy_sources: Dict[str, dict],
+                         elapsed: float, checks_before: float, source_health: SourceHealth) -> None:
+    """记录本轮各代理源的送验数/有效数/有效率（指标与源健康记录）与验证吞吐"""
+    valid_set = set(valid_proxies)
+    history_source = {"name": "history"}  # 历史复检的代理不归属任何源
+    counts = {}  # id(源配置) -> [源配置, 送验数, 有效数]
+    for proxy in checked_proxies:
+        source = proxy_sources.get(proxy, history_source)
+        entry = counts.setdefault(id(source), [source, 0, 0])
+        entry[1] += 1
+        entry[2] += proxy in valid_set
+    for gauge in (metrics.SOURCE_ROUND_CHECKED, metrics.SOURCE_ROUND_VALID, metrics.SOURCE_ROUND_YIELD):
+        gauge.clear()
+    for source, checked_count, valid_count in counts.values():
+        # 指标按源名称汇总（同名的源合并），健康记录按源配置分别记录
+        metrics.SOURCE_ROUND_CHECKED.inc(checked_count, source=source["name"])
+        metrics.SOURCE_ROUND_VALID.inc(valid_count, source=source["name"])
+        if source is not history_source:
+            source_health.record_yield(source, checked_count, valid_count)
+    for name in {source["name"] for source, _, _ in counts.values()}:
+        metrics.SOURCE_ROUND_YIELD.set(metrics.SOURCE_ROUND_VALID.get(source=name) /
+                                       metrics.SOURCE_ROUND_CHECKED.get(source=name), source=name)
+    checks = metrics.CHECKS.get(result="valid") + metrics.CHECKS.get(result="invalid") - checks_before
+    metrics.ROUND_CHECKS_PER_SECOND.set(checks / elapsed if elapsed > 0 else 0)
+
+
+def main(argv: Optional[List[str]] = None):
+    # 运行参数：命令行/配置文件（systemd、容器等非交互环境），终端中不带参数运行时进入配置向导
+    options = parse_options(argv)
+    if options["interactive"]:
+        ask_options(options)
+    check_hours = options["interval"]
+    check_interval = int(check_hours * 3600)
+    proxy_type = options["type"]
+    thread_count = options["threads"]
+    recheck_interval = int(options["recheck"] * 60)
+    validate_budget = options["budget"] or None
+    shard_count = options["shards"]
+    shard_workers = options["shard_workers"]
+    api_host, api_port = options["api_host"], options["api_port"]
+    metrics_file = options["metrics_file"]
     test_config = {
-        "url": "http://captive.apple.com/",
-        "keyword": "Success",
-        "encoding": "utf-8"
+        "url": options["test_url"],
+        "keyword": options["keyword"],
+        "encoding": "utf-8",
+        "classify": options["classify"]
     }
 
     # 启动信息
@@ -34,45 +189,191 @@ def main():
     print("=" * 80)
     print(f"📋 核心配置：")
     print(f"   ├─ 爬取类型：{proxy_type}（all=全部 / normal=普通 / anonymous=高匿）")
-    print(f"   ├─ 检查间隔：{check_hours} 小时（{check_interval} 秒）")
-    print(f"   ├─ 验证线程数：{thread_count} 个")
-    print(f"   └─ 测试URL：{test_config['url']}")
+    print(f"   ├─ 刷新间隔：{check_hours} 小时（{check_interval} 秒，代理源可单独配置 interval）")
+    print(f"   ├─ 复检间隔：{recheck_interval // 60} 分钟（有效代理）")
+    print(f"   ├─ 验证线程数：{thread_count} 个" + (f"（每分片，共 {shard_count} 个分片）" if shard_count else ""))
+    print(f"   ├─ 验证时间预算：" + (f"{validate_budget} 秒/轮（超时自适应）" if validate_budget else "不限制（超时自适应）"))
+    print(f"   ├─ 测试URL：{test_config['url']}")
+    print(f"   └─ 代理API：http://{api_host}:{api_port}（/random /best /all /count /checkout /release /delete /metrics）")
     print("=" * 80 + "\n")
 
+    # 本地代理查询服务：先加载上次保存的结果，每轮验证后原子替换索引与租用池
+    proxy_index = ProxyIndex()
+    proxy_leases = ProxyLeasePool()  # 代理租用：按评分轮换分配，使用反馈决定轮次之间的暂停
+    if proxy_index.load_json("proxy_ip.json"):
+        print(f"♻️  [代理API] 已加载上次保存的代理：{proxy_index.count()}")
+    proxy_leases.update(proxy_index.all())
+    ProxyApiServer(proxy_index, api_host, api_port, proxy_leases).start()
+
+    # 流式流水线：爬虫每解析一页就把新候选代理送入验证队列，爬取与验证同时进行
+    # 分片模式：爬取结束后把去重后的候选代理拆分给多个工作进程/节点验证
+    validator = ProxyValidator()
+    if test_config["classify"]:
+        if validator.enable_anonymity_check(test_config["url"]):
+            print(f"🕵️  [匿名度检测] 已开启 | 本机出口IP：{validator.real_ip}")
+        else:
+            print("⚠️ [匿名度检测] 无法获取本机出口IP，沿用代理源标注的类型")
+    geo_index = None
+    if options["geo_db"]:
+        from utils.geoip import GeoIndex  # 仅配置了归属数据库时需要
+        try:
+            geo_index = GeoIndex(options["geo_db"])
+        except (OSError, EOFError, ValueError) as e:  # ValueError 含 UnicodeDecodeError（非文本文件）
+            print(f"⚠️ [归属查询] 加载IP段数据库失败，跳过国家/ASN补充：{str(e)[:50]}")
+        else:
+            if len(geo_index):
+                print(f"🌍 [归属查询] 已加载IP段数据库：{len(geo_index)} 个IP段")
+            else:
+                print("⚠️ [归属查询] IP段数据库中未解析到任何IP段（请检查分隔符与列顺序），跳过国家/ASN补充")
+                geo_index = None
+    coordinator = None
+    if shard_count:
+        from utils.sharding import ShardCoordinator  # 仅分片模式需要（按需导入 multiprocessing）
+        coordinator = ShardCoordinator("shards", shard_count, shard_workers)
+    history = ProxyHistory("proxy_history.json")  # 跨轮次持久化的代理历史（增量验证）
+    proxy_db = ProxyDatabase("proxy_pool.db")  # 可供其他进程并发查询的代理池
+    change_feed = ProxyChangeFeed("proxy_changes.ndjson", "proxy_snapshot.json")  # 增量变更流 + 定期压缩快照
+    page_cache = PageCache("page_cache.json")  # 代理源页面缓存（未变化的页面跳过下载与解析）
+    source_health = SourceHealth("source_health.json")  # 代理源健康度与熔断（跳过失效的源）
+    proxy_types = {}  # 本轮候选代理 -> 类型（同时出现在两类源时优先高匿）
+    skipped_proxies = set()  # 本轮因连续失败退避而跳过的代理
+    proxy_sources = {}  # 本轮送验代理 -> 首次发现它的代理源配置（统计各源有效率）
+    source_stats = {}  # id(源配置) -> 本轮候选数与历史中从未出现过的新代理数（自适应刷新间隔）
+    round_state = {"start_time": 0.0, "first_valid": False}
+
+    def on_candidates(proxies: List[str], source: dict, type_tag: str) -> None:
+        stats = source_stats.setdefault(id(source), {"seen": 0, "new": 0})
+        for proxy in proxies:
+            stats["seen"] += 1
+            stats["new"] += proxy not in history.records
+            history.record_seen(proxy, source["name"], type_tag)
+            if proxy in proxy_types:
+                if type_tag == "anonymous":
+                    proxy_types[proxy] = "anonymous"
+            elif history.should_check(proxy):
+                proxy_types[proxy] = type_tag
+                proxy_sources[proxy] = source
+                if not coordinator:
+                    validator.submit(proxy)
+            else:
+                skipped_proxies.add(proxy)
+
+    def measured_type(proxy: str, timing: Dict) -> str:
+        """实测类型：开启匿名度检测时高匿（elite）归为 anonymous，透明/普通匿名归为 normal，否则沿用代理源标注"""
+        if timing.get("anonymity"):
+            return "anonymous" if timing["anonymity"] == "elite" else "normal"
+        return proxy_types[proxy]
+
+    def pool_entry(proxy: str, timing: Dict, type_tag: str, checked_at: float) -> Dict:
+        """有效代理池条目：耗时指标 + 类型 + 评分（结合历史成功率）+ 验证时间 + 归属"""
+        entry = dict(timing, proxy=proxy, type=type_tag, score=history.score(proxy, timing["total_ms"]),
+                     checked_at=checked_at)
+        if geo_index:
+            entry.update(geo_index.lookup(proxy) or dict.fromkeys(GEO_FIELDS))  # 离线查询国家/ASN
+        return entry
+
+    def on_valid(proxy: str) -> None:
+        # 在验证线程中调用：验证通过即加入查询索引与租用池，爬取仍在进行时 /random、/checkout 即可取到
+        timing = validator.results[proxy]
+        type_tag = measured_type(proxy, timing)
+        if proxy_type == "all" or type_tag == proxy_type:
+            entry = pool_entry(proxy, timing, type_tag, round(time.time(), 3))
+            proxy_index.add(entry)
+            proxy_leases.upsert(entry)
+        if not round_state["first_valid"]:
+            round_state["first_valid"] = True
+            elapsed = time.time() - round_state["start_time"]
+            print(f"⚡ [流水线] 首个可用代理：{proxy}（本轮开始后 {elapsed:.1f} 秒，已可通过代理API获取）")
+
+    # 初始化爬虫实例（跨轮次复用，保持与各代理源的长连接）
+    crawler_normal = ProxyCrawler(
+        on_proxies=lambda proxies, source: on_candidates(proxies, source, "normal"),
+        page_cache=page_cache, source_health=source_health
+    ) if proxy_type in ["all", "normal"] else None
+    crawler_anonymous = ProxyCrawler(
+        on_proxies=lambda proxies, source: on_candidates(proxies, source, "anonymous"),
+        page_cache=page_cache, source_health=source_health
+    ) if proxy_type in ["all", "anonymous"] else None
+
+    # 代理源调度：每个源按自己的 interval 到期刷新；有效代理按 recheck_interval 单独复检
+    scheduler = SourceScheduler(check_interval)
+    if crawler_normal:
+        for source in NORMAL_PROXIES:
+            scheduler.add(source, "normal")
+    if crawler_anonymous:
+        for source in ANONYMOUS_PROXIES:
+            scheduler.add(source, "anonymous")
+    pool = {entry["proxy"]: entry for entry in proxy_index.all()}  # 当前有效代理池：代理 -> 类型与指标
+    next_recheck = 0.0
+
     while True:
-        # 初始化爬虫实例
-        crawler_normal = ProxyCrawler() if proxy_type in ["all", "normal"] else None
-        crawler_anonymous = ProxyCrawler() if proxy_type in ["all", "anonymous"] else None
-
-        # 爬取普通代理
-        normal_proxies = []
-        if proxy_type in ["all", "normal"]:
-            print("📥 [阶段1/3] 开始爬取 普通代理 IP...")
-            print("-" * 50)
-            for source in NORMAL_PROXIES:
-                crawler_normal.crawl(source)
-            print("\n🔍 [普通代理] 开始去重...")
-            normal_proxies = crawler_normal.get_unique_proxies()
-            print(f"✅ [普通代理] 最终可用IP数：{len(normal_proxies)} 个\n")
-
-        # 爬取高匿代理
-        anonymous_proxies = []
-        if proxy_type in ["all", "anonymous"]:
-            print("📥 [阶段1/3] 开始爬取 高匿代理 IP...")
-            print("-" * 50)
-            for source in ANONYMOUS_PROXIES:
-                crawler_anonymous.crawl(source)
-            print("\n🔍 [高匿代理] 开始去重...")
-            anonymous_proxies = crawler_anonymous.get_unique_proxies()
-            print(f"✅ [高匿代理] 最终可用IP数：{len(anonymous_proxies)} 个\n")
-
-        # 合并代理并统计
-        proxy_with_type = []
-        for ip in normal_proxies:
-            proxy_with_type.append((ip, "normal"))
-        for ip in anonymous_proxies:
-            proxy_with_type.append((ip, "anonymous"))
-        all_proxies = [item[0] for item in proxy_with_type]
+        now = time.time()
+        due_sources = scheduler.due(now)
+        recheck = now >= next_recheck
+        if not due_sources and not recheck:
+            wake_time = min(scheduler.next_time(), next_recheck)
+            time.sleep(max(1.0, wake_time - now))
+            continue
+
+        proxy_types.clear()
+        skipped_proxies.clear()
+        proxy_sources.clear()
+        source_stats.clear()
+        checks_before = metrics.CHECKS.get(result="valid") + metrics.CHECKS.get(result="invalid")
+        round_state.update(start_time=time.time(), first_valid=False)
+        # 验证时间预算从本轮开始计算（流式验证与分片验证一致）
+        round_deadline = round_state["start_time"] + validate_budget if validate_budget else None
+
+        # 并发爬取到期的代理源（普通/高匿共用按主机限速器），验证线程池同步消费候选代理
+        crawl_jobs = []
+        if crawler_normal:
+            crawl_jobs.append((crawler_normal, [source for source, type_tag in due_sources if type_tag == "normal"]))
+        if crawler_anonymous:
+            crawl_jobs.append((crawler_anonymous,
+                               [source for source, type_tag in due_sources if type_tag == "anonymous"]))
+        print(f"📥 [阶段1/3] 开始并发爬取 {len(due_sources)} 个到期代理源{'' if coordinator else '（边爬取边验证）'}"
+              f"{' + 复检有效代理' if recheck else ''}...")
+        print(f"ℹ️  验证配置：线程数={thread_count} | 测试URL={test_config['url']}")
+        print("-" * 50)
+        if not coordinator:
+            validator.start(test_config["url"], test_config["keyword"], thread_count, on_valid=on_valid,
+                            budget=validate_budget)
+
+        # 复检到期：历史可用代理优先复检，不必等爬虫重新发现
+        recheck_proxies = []
+        if recheck:
+            known_good = [proxy for proxy in history.known_good() if proxy_type in ["all", history.get_type(proxy)]]
+            recheck_proxies = list(dict.fromkeys(known_good + list(pool)))
+            for proxy in recheck_proxies:
+                proxy_types[proxy] = pool[proxy]["type"] if proxy in pool else history.get_type(proxy)
+                if not coordinator:
+                    validator.submit(proxy, seed=False)  # 已知有效代理偏快，不计入自适应超时样本
+            print(f"♻️  [复检] 复检有效代理：{len(recheck_proxies)} 个")
+
+        page_cache.hit_count = 0
+        stage_start = time.perf_counter()
+        asyncio.run(crawl_sources(crawl_jobs))
+        page_cache.save()
+        metrics.ROUND_STAGE_SECONDS.set(time.perf_counter() - stage_start, stage="crawl")
+
+        # 按本次新候选比例安排各源下次刷新（熔断中跳过的源未实际爬取，不计入自适应间隔，熔断到期后再调度探测）
+        breaker_skipped = set().union(*(crawler.breaker_skipped for crawler in (crawler_normal, crawler_anonymous)
+                                        if crawler))
+        for source, _ in due_sources:
+            if id(source) in breaker_skipped:
+                scheduler.postpone(source, source_health.remaining(source))
+                continue
+            stats = source_stats.get(id(source), {"seen": 0, "new": 0})
+            interval = scheduler.record(source, stats["seen"], stats["new"])
+            print(f"🗓️  [调度] {source['name']} | 候选 {stats['seen']} 个（新出现 {stats['new']} 个）| "
+                  f"下次刷新：{interval / 60:.0f} 分钟后")
+
+        stage_start = time.perf_counter()
+        normal_proxies = crawler_normal.get_unique_candidates() if crawler_normal else CandidateStore()
+        anonymous_proxies = crawler_anonymous.get_unique_candidates() if crawler_anonymous else CandidateStore()
+        overlap_count = len(normal_proxies.intersection(anonymous_proxies))
+        all_proxies = list(proxy_types)
+        metrics.ROUND_STAGE_SECONDS.set(time.perf_counter() - stage_start, stage="dedup")
 
         # 爬取结果汇总
         print("=" * 60)
@@ -80,67 +381,138 @@ def main():
         print("=" * 60)
         print(f"   ├─ 普通代理：{len(normal_proxies):3d} 个")
         print(f"   ├─ 高匿代理：{len(anonymous_proxies):3d} 个")
-        print(f"   └─ 总待验证：{len(all_proxies):3d} 个")
+        print(f"   ├─ 跨类型重复：{overlap_count:3d} 个（按高匿处理）")
+        print(f"   ├─ 未变化页面：{page_cache.hit_count:3d} 页（复用上次结果）")
+        print(f"   ├─ 有效代理复检：{len(recheck_proxies):3d} 个")
+        print(f"   ├─ 退避跳过：{len(skipped_proxies):3d} 个（连续验证失败）")
+        print(f"   └─ 总待验证：{len(all_proxies):3d} 个（已去除跨类型重复）")
         print("=" * 60 + "\n")
 
-        # 批量验证
+        # 等待剩余验证完成
+        stage_start = time.perf_counter()
+        if coordinator:
+            print("🔍 [阶段2/3] 爬取结束，分片验证去重后的候选代理...")
+            valid_proxies, check_results = coordinator.validate(all_proxies, test_config["url"],
+                                                                test_config["keyword"], thread_count,
+                                                                real_ip=validator.real_ip,
+                                                                deadline=round_deadline,
+                                                                unseeded=recheck_proxies)
+            cancelled_set = set(coordinator.cancelled_proxies)
+        else:
+            print("🔍 [阶段2/3] 爬取结束，等待剩余代理验证完成...")
+            valid_proxies, check_results = validator.finish(), validator.results
+            cancelled_set = set(validator.cancelled_proxies)
+        metrics.ROUND_STAGE_SECONDS.set(time.perf_counter() - stage_start, stage="validate")  # 爬取结束后的剩余验证
+        # 时间预算用尽或被自适应超时截断的代理结果未知：不计入历史与统计，代理池中的保持不变，下一轮再验证
+        checked_proxies = [proxy for proxy in all_proxies if proxy not in cancelled_set]
+        record_round_metrics(checked_proxies, valid_proxies, proxy_sources, time.time() - round_state["start_time"],
+                             checks_before, source_health)
+        source_health.save()
+
+        # 更新历史记录
+        valid_set = set(valid_proxies)
+        for proxy in checked_proxies:
+            history.record_result(proxy, proxy in valid_set)
+
+        # 合并到有效代理池：本次验证通过的加入/刷新指标（耗时结合历史成功率计算评分），失败的移出
+        # 开启匿名度检测时按实测结果定类型：高匿（elite）归为 anonymous，透明/普通匿名归为 normal
+        relabeled_count = 0
+        checked_at = round(time.time(), 3)  # 本轮验证时间（未重新验证的代理保留上次的时间）
+        for proxy in checked_proxies:
+            if proxy not in valid_set:
+                pool.pop(proxy, None)
+                continue
+            timing = check_results[proxy]
+            type_tag = measured_type(proxy, timing)
+            if timing.get("anonymity"):
+                relabeled_count += type_tag != proxy_types[proxy]
+                history.record_type(proxy, type_tag)
+            if proxy_type != "all" and type_tag != proxy_type:
+                pool.pop(proxy, None)  # 实测类型与所选爬取类型不符
+                continue
+            pool[proxy] = pool_entry(proxy, timing, type_tag, checked_at)
+        if relabeled_count:
+            print(f"🕵️  [匿名度检测] {relabeled_count} 个代理的实测类型与代理源标注不符，已按实测结果归类")
+        history.save()
+        saved_fields = METRIC_FIELDS + ("anonymity", "checked_at") + GEO_FIELDS
+        proxy_metrics = {proxy: {field: entry.get(field) for field in saved_fields} for proxy, entry in pool.items()}
+
+        # 按类型拆分有效代理
         valid_normal, valid_anonymous = [], []
-        if all_proxies:
-            print("🔍 [阶段2/3] 开始批量验证代理有效性...")
-            print(f"ℹ️  验证配置：线程数={thread_count} | 测试URL={test_config['url']}")
-            validator = ProxyValidator()
-            valid_proxies = validator.validate(
-                all_proxies,
-                test_config["url"],
-                test_config["keyword"],
-                thread_count
-            )
-
-            # 按类型拆分有效代理
-            valid_set = set(valid_proxies)
-            for ip, type_tag in proxy_with_type:
-                if ip in valid_set:
-                    if type_tag == "normal":
-                        valid_normal.append(ip)
-                    else:
-                        valid_anonymous.append(ip)
-
-            # 去重冲突（优先保留高匿）
-            valid_normal = [ip for ip in valid_normal if ip not in valid_anonymous]
+        for proxy, entry in pool.items():
+            if entry["type"] == "anonymous":
+                valid_anonymous.append(proxy)
+            else:
+                valid_normal.append(proxy)
 
+        if all_proxies:
             # 验证结果显示
-            print(f"\n✅ [验证完成]")
+            round_metrics = {proxy: pool[proxy] for proxy in valid_proxies if proxy in pool}
+            print(f"\n✅ [验证完成]（本轮耗时 {time.time() - round_state['start_time']:.1f} 秒）")
             print(f"   ├─ 总待验证：{len(all_proxies):3d} 个")
+            if cancelled_set:
+                print(f"   ├─ 预算用尽取消：{len(cancelled_set):3d} 个（下一轮再验证）")
             print(f"   ├─ 有效代理：{len(valid_proxies):3d} 个")
-            print(f"   ├─ 有效率：{(len(valid_proxies) / len(all_proxies) * 100):6.2f}%")
-            print(f"   ├─ 有效普通代理：{len(valid_normal):3d} 个（示例：{valid_normal[:2]}）")
-            print(f"   └─ 有效高匿代理：{len(valid_anonymous):3d} 个（示例：{valid_anonymous[:2]}）")
+            print(f"   ├─ 有效率：{(len(valid_proxies) / max(1, len(checked_proxies)) * 100):6.2f}%")
+            if round_metrics:
+                avg_total = sum(m["total_ms"] for m in round_metrics.values()) / len(round_metrics)
+                best_proxy = max(round_metrics, key=lambda proxy: round_metrics[proxy]["score"])
+                print(f"   ├─ 平均总耗时：{avg_total:.0f} ms | 最佳代理：{best_proxy}（评分 {round_metrics[best_proxy]['score']}）")
+            print(f"   ├─ 代理池普通代理：{len(valid_normal):3d} 个（示例：{valid_normal[:2]}）")
+            print(f"   └─ 代理池高匿代理：{len(valid_anonymous):3d} 个（示例：{valid_anonymous[:2]}）")
         else:
             print("⚠️ [阶段2/3] 无待验证的代理IP，跳过验证步骤")
 
         # 保存结果
         print("\n" + "=" * 60)
         print("💾 [阶段3/3] 保存有效代理IP...")
+        stage_start = time.perf_counter()
         ProxyStorage.save_proxies_with_type(
             filename="proxy_ip.json",
             normal_proxies=valid_normal,
-            anonymous_proxies=valid_anonymous
+            anonymous_proxies=valid_anonymous,
+            metrics=proxy_metrics
         )
+        ProxyStorage.save_binary_snapshot("proxy_pool.bin", valid_normal, valid_anonymous, proxy_metrics)
+        proxy_index.update(valid_normal, valid_anonymous, proxy_metrics)
+        proxy_leases.update(proxy_index.all())
+        db_stats = proxy_db.save_round(valid_normal, valid_anonymous, proxy_metrics)
+        feed_stats = change_feed.record_round(valid_normal, valid_anonymous, proxy_metrics)
+        metrics.ROUND_STAGE_SECONDS.set(time.perf_counter() - stage_start, stage="save")
+        metrics.POOL_SIZE.set(len(valid_normal), type="normal")
+        metrics.POOL_SIZE.set(len(valid_anonymous), type="anonymous")
+        metrics.ROUNDS.inc()
+        metrics.ROUND_TIMESTAMP.set(time.time())
+        metrics.REGISTRY.write_file(metrics_file)
 
         # 保存结果汇总
         total_valid = len(valid_normal) + len(valid_anonymous)
         print(f"✅ 保存完成！")
-        print(f"   ├─ 保存文件：proxy_ip.json")
+        print(f"   ├─ 保存文件：proxy_ip.json / proxy_pool.db / proxy_pool.bin / proxy_changes.ndjson / "
+              f"{metrics_file}")
+        print(f"   ├─ 数据库变更：新增 {db_stats['inserted']} | 更新 {db_stats['updated']} | "
+              f"复检未变 {db_stats['rechecked']} | 未变 {db_stats['unchanged']} | 删除 {db_stats['deleted']}")
+        print(f"   ├─ 变更流：新增 {feed_stats['add']} | 评分变化 {feed_stats['rescore']} | 移除 {feed_stats['remove']}"
+              f"（序号 {change_feed.seq}）")
+        lease_stats = proxy_leases.stats()
+        print(f"   ├─ 代理租用：租出 {lease_stats['leased']} | 因使用反馈暂停 {lease_stats['benched']}")
         print(f"   ├─ 有效普通代理：{len(valid_normal):3d} 个")
         print(f"   ├─ 有效高匿代理：{len(valid_anonymous):3d} 个")
         print(f"   └─ 总计有效代理：{total_valid:3d} 个")
         print("=" * 60)
 
         # 下一轮提示
-        next_round = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() + check_interval))
-        print(f"\n⏰ 本轮任务完成！{check_hours}小时后（预计 {next_round}）开始下一轮检查")
+        if recheck:
+            next_recheck = time.time() + recheck_interval
+        next_time = min(scheduler.next_time(), next_recheck)
+        next_round = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(next_time))
+        if options["once"]:
+            print("\n⏰ 本轮任务完成！（--once，退出）")
+            proxy_db.close()
+            break
+        print(f"\n⏰ 本轮任务完成！下一个任务预计 {next_round} 开始"
+              f"（代理源刷新 / 每 {recheck_interval // 60} 分钟复检有效代理）")
         print("-" * 80 + "\n")
-        time.sleep(check_interval)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,271 @@
+import json
+import os
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from utils import metrics
+from utils.lease import STRATEGIES, ProxyLeasePool
+
+PROXY_TYPES = ("normal", "anonymous")
+
+
+class ProxyIndex:
+    """内存代理索引：每轮验证后整体替换快照（本轮中验证通过的代理也即时加入），查询无锁、不受爬取/验证阻塞"""
+
+    def __init__(self):
+        self._snapshot = self._build([], [], {})
+        self._lock = threading.Lock()  # 写入方（每轮替换、验证线程即时加入、上报失效）之间互斥
+
+    @staticmethod
+    def _build(normal_proxies: List[str], anonymous_proxies: List[str], metrics: Dict[str, Dict]) -> Dict:
+        """内部方法：构建只读快照（各类型列表均按评分从高到低排序）"""
+        by_proxy = {}
+        for type_tag, proxies in (("normal", normal_proxies), ("anonymous", anonymous_proxies)):
+            for proxy in proxies:
+                by_proxy[proxy] = dict(metrics.get(proxy, {}), proxy=proxy, type=type_tag)
+        return ProxyIndex._build_from(by_proxy, set())
+
+    @staticmethod
+    def _build_from(by_proxy: Dict[str, Dict], removed: set) -> Dict:
+        """内部方法：由 代理 -> 条目 构建快照"""
+
+        def ranked(entries: List[Dict]) -> List[Dict]:
+            return sorted(entries, key=lambda entry: entry.get("score", -1), reverse=True)
+
+        entries = ranked(list(by_proxy.values()))
+        # 按 (类型, 国家) / (类型, ASN) 预先分组，按地区过滤时直接取对应列表
+        by_region = {}
+        for entry in entries:
+            for type_key in ("all", entry["type"]):
+                if entry.get("country"):
+                    by_region.setdefault((type_key, "country", entry["country"]), []).append(entry)
+                if entry.get("asn"):
+                    by_region.setdefault((type_key, "asn", entry["asn"]), []).append(entry)
+        return {
+            "all": entries,
+            "normal": [entry for entry in entries if entry["type"] == "normal"],
+            "anonymous": [entry for entry in entries if entry["type"] == "anonymous"],
+            "by_region": by_region,
+            "by_proxy": by_proxy,
+            "removed": removed  # 被上报失效的代理，随快照一起在下一轮替换时清空
+        }
+
+    @staticmethod
+    def _entries(snapshot: Dict, type_tag: Optional[str], country: Optional[str], asn: Optional[int]) -> List[Dict]:
+        """内部方法：按类型与地区（国家代码/ASN）取候选列表（按评分从高到低）"""
+        type_key = type_tag or "all"
+        if country and asn:
+            return [entry for entry in snapshot["by_region"].get((type_key, "country", country.upper()), [])
+                    if entry.get("asn") == asn]
+        if country:
+            return snapshot["by_region"].get((type_key, "country", country.upper()), [])
+        if asn:
+            return snapshot["by_region"].get((type_key, "asn", asn), [])
+        return snapshot[type_key]
+
+    def update(self, normal_proxies: List[str], anonymous_proxies: List[str],
+               metrics: Optional[Dict[str, Dict]] = None) -> None:
+        """用新一轮的有效代理原子替换快照"""
+        snapshot = self._build(normal_proxies, anonymous_proxies, metrics or {})
+        with self._lock:
+            self._snapshot = snapshot
+
+    def add(self, entry: Dict) -> None:
+        """加入/刷新单个有效代理（含 proxy/type 与指标），本轮验证通过即可查询，不必等本轮结束"""
+        with self._lock:
+            snapshot = self._snapshot
+            by_proxy = dict(snapshot["by_proxy"])
+            by_proxy[entry["proxy"]] = entry
+            self._snapshot = self._build_from(by_proxy, snapshot["removed"] - {entry["proxy"]})
+
+    def load_json(self, filename: str) -> bool:
+        """从已保存的 proxy_ip.json 预加载（重启后立即可用）"""
+        if not os.path.exists(filename):
+            return False
+        try:
+            with open(filename, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            proxy_list = data.get("proxy_list", {})
+            self.update(proxy_list.get("normal", []), proxy_list.get("anonymous", []), data.get("metrics", {}))
+            return True
+        except (OSError, ValueError) as e:
+            print(f"⚠️ [代理索引] 加载 {filename} 失败：{str(e)[:50]}")
+            return False
+
+    def random(self, type_tag: Optional[str] = None, country: Optional[str] = None,
+               asn: Optional[int] = None) -> Optional[Dict]:
+        """随机获取一个可用代理"""
+        snapshot = self._snapshot
+        entries, removed = self._entries(snapshot, type_tag, country, asn), snapshot["removed"]
+        # 先随机抽样几次，失效代理较多时退化为过滤后抽取
+        for _ in range(8):
+            if not entries:
+                return None
+            entry = random.choice(entries)
+            if entry["proxy"] not in removed:
+                return entry
+        alive = [entry for entry in entries if entry["proxy"] not in removed]
+        return random.choice(alive) if alive else None
+
+    def best(self, n: int = 1, type_tag: Optional[str] = None, country: Optional[str] = None,
+             asn: Optional[int] = None) -> List[Dict]:
+        """获取评分最高的 n 个代理（n<=0 时返回空列表）"""
+        snapshot = self._snapshot
+        result = []
+        if n <= 0:
+            return result
+        for entry in self._entries(snapshot, type_tag, country, asn):
+            if entry["proxy"] not in snapshot["removed"]:
+                result.append(entry)
+                if len(result) >= n:
+                    break
+        return result
+
+    def all(self, type_tag: Optional[str] = None, country: Optional[str] = None,
+            asn: Optional[int] = None) -> List[Dict]:
+        """获取全部可用代理"""
+        snapshot = self._snapshot
+        return [entry for entry in self._entries(snapshot, type_tag, country, asn)
+                if entry["proxy"] not in snapshot["removed"]]
+
+    def remove(self, proxy: str) -> bool:
+        """标记代理失效（上报不可用），返回代理是否存在于当前快照"""
+        with self._lock:
+            snapshot = self._snapshot
+            if proxy not in snapshot["by_proxy"]:
+                return False
+            snapshot["removed"].add(proxy)
+            return True
+
+    def count(self, country: Optional[str] = None, asn: Optional[int] = None) -> Dict[str, int]:
+        """各类型可用代理数量"""
+        return {type_tag: len(self.all(type_tag, country, asn)) for type_tag in PROXY_TYPES}
+
+
+class ProxyApiHandler(BaseHTTPRequestHandler):
+    """代理查询接口请求处理"""
+
+    index = None  # 由 ProxyApiServer 注入
+    leases = None  # 由 ProxyApiServer 注入
+
+    def _send_json(self, data, status: int = 200) -> None:
+        """内部方法：返回JSON响应"""
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, text: str, content_type: str) -> None:
+        """内部方法：返回文本响应"""
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self) -> None:
+        """内部方法：按路径分发请求"""
+        url = urlsplit(self.path)
+        if url.path == "/metrics":
+            self._send_text(metrics.REGISTRY.render(), "text/plain; version=0.0.4; charset=utf-8")
+            return
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        type_tag = params.get("type") or None
+        if type_tag and type_tag not in PROXY_TYPES:
+            self._send_json({"code": 400, "msg": "type 仅支持 normal/anonymous"}, 400)
+            return
+        country = params.get("country") or None
+        asn = params.get("asn", "").upper()
+        asn = asn[2:] if asn.startswith("AS") else asn
+        if asn and not asn.isdigit():
+            self._send_json({"code": 400, "msg": "asn 须为数字（如 13335 或 AS13335）"}, 400)
+            return
+        asn = int(asn) if asn else None
+
+        if url.path == "/random":
+            entry = self.index.random(type_tag, country, asn)
+            self._send_json({"code": 0, "data": entry} if entry else {"code": 404, "msg": "无可用代理"},
+                            200 if entry else 404)
+        elif url.path == "/best":
+            n = int(params["n"]) if params.get("n", "").isdigit() else 1
+            self._send_json({"code": 0, "data": self.index.best(n, type_tag, country, asn)})
+        elif url.path == "/all":
+            self._send_json({"code": 0, "data": self.index.all(type_tag, country, asn)})
+        elif url.path == "/count":
+            self._send_json({"code": 0, "data": self.index.count(country, asn)})
+        elif url.path == "/checkout":
+            strategy = params.get("strategy") or "weighted"
+            if strategy not in STRATEGIES:
+                self._send_json({"code": 400, "msg": f"strategy 仅支持 {'/'.join(STRATEGIES)}"}, 400)
+                return
+            ttl = float(params["ttl"]) if params.get("ttl", "").isdigit() else None
+            lease = self.leases.checkout(type_tag, country, asn, strategy, ttl)
+            self._send_json({"code": 0, "data": lease} if lease else {"code": 404, "msg": "无可用代理"},
+                            200 if lease else 404)
+        elif url.path == "/release":
+            ok = params.get("ok")
+            success = None if ok is None else ok in ("1", "true", "yes")
+            result = self.leases.release(params.get("lease", ""), success)
+            self._send_json({"code": 0, "data": result} if result else {"code": 404, "msg": "租约不存在或已过期"},
+                            200 if result else 404)
+        elif url.path == "/delete":
+            proxy = params.get("proxy", "")
+            self.leases.report(proxy, False)  # 计入租用健康度
+            leased = self.leases.remove(proxy)  # 本轮内不再租出
+            if self.index.remove(proxy) or leased:
+                self._send_json({"code": 0, "msg": f"已标记失效：{proxy}"})
+            else:
+                self._send_json({"code": 404, "msg": f"代理不存在：{proxy}"}, 404)
+        else:
+            self._send_json({"code": 404, "msg": "未知接口，支持：/random /best /all /count /checkout /release /delete /metrics"}, 404)
+
+    def do_GET(self) -> None:
+        self._handle()
+
+    def do_DELETE(self) -> None:
+        self._handle()
+
+    def log_message(self, format, *args) -> None:
+        """关闭默认的逐请求访问日志"""
+        pass
+
+
+class ProxyApiServer:
+    """本地HTTP代理查询服务：在后台线程中运行，与爬取/验证循环互不阻塞"""
+
+    def __init__(self, index: ProxyIndex, host: str = "127.0.0.1", port: int = 5010,
+                 leases: Optional[ProxyLeasePool] = None):
+        """
+        :param index: 代理查询索引
+        :param host: 监听地址
+        :param port: 监听端口
+        :param leases: 代理租用池（/checkout /release），为空时新建一个默认配置的租用池
+        """
+        self.index = index
+        self.leases = leases or ProxyLeasePool()
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self) -> None:
+        """启动服务（后台线程）"""
+        handler = type("BoundProxyApiHandler", (ProxyApiHandler,), {"index": self.index, "leases": self.leases})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"🌐 [代理API] 服务已启动：http://{self.host}:{self.port}")
+
+    def stop(self) -> None:
+        """停止服务"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
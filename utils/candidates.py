@@ -0,0 +1,127 @@
+import bisect
+import heapq
+import re
+from array import array
+from typing import Iterable, Iterator, List, Optional
+
+# IPv4:PORT（端口两侧允许空白，与原 _is_valid_proxy 校验规则一致）
+PROXY_PATTERN = re.compile(r'(\d+)\.(\d+)\.(\d+)\.(\d+):\s*(\d+)\s*')
+
+
+def pack_proxy(proxy: str) -> Optional[int]:
+    """将 IP:PORT 打包为整数（IPv4 占高32位，端口占低16位），格式非法时返回 None"""
+    match = PROXY_PATTERN.fullmatch(proxy) if proxy else None
+    if not match:
+        return None
+    a, b, c, d, port = map(int, match.groups())
+    if a > 255 or b > 255 or c > 255 or d > 255 or not 1 <= port <= 65535:
+        return None
+    return (a << 40) | (b << 32) | (c << 24) | (d << 16) | port
+
+
+def unpack_proxy(value: int) -> str:
+    """将打包整数还原为 IP:PORT 字符串"""
+    return f"{value >> 40 & 255}.{value >> 32 & 255}.{value >> 24 & 255}.{value >> 16 & 255}:{value & 0xFFFF}"
+
+
+def pack_proxies(proxies: Iterable[str]) -> array:
+    """批量校验并打包，返回仅包含合法代理的整数数组"""
+    packed = array('Q')
+    append = packed.append
+    fullmatch = PROXY_PATTERN.fullmatch
+    for proxy in proxies:
+        match = fullmatch(proxy) if proxy else None
+        if not match:
+            continue
+        a, b, c, d, port = map(int, match.groups())
+        if a > 255 or b > 255 or c > 255 or d > 255 or not 1 <= port <= 65535:
+            continue
+        append((a << 40) | (b << 32) | (c << 24) | (d << 16) | port)
+    return packed
+
+
+class CandidateStore:
+    """紧凑候选代理存储：每个代理占8字节（array('Q')），去重与集合运算均基于整数"""
+
+    def __init__(self, values: Iterable[int] = ()):
+        self._data = array('Q', values)
+
+    @classmethod
+    def from_proxies(cls, proxies: Iterable[str]) -> "CandidateStore":
+        """从 IP:PORT 字符串构建（非法格式自动丢弃）"""
+        store = cls()
+        store._data = pack_proxies(proxies)
+        return store
+
+    def extend(self, values: Iterable[int]) -> None:
+        """追加已打包的代理"""
+        self._data.extend(values)
+
+    def clear(self) -> None:
+        """清空存储"""
+        self._data = array('Q')
+
+    def unique(self) -> "CandidateStore":
+        """去重并按整数值排序，返回新的存储"""
+        return CandidateStore(sorted(set(self._data)))
+
+    def intersection(self, other: "CandidateStore") -> "CandidateStore":
+        """交集（去重、有序）"""
+        return CandidateStore(sorted(set(self._data).intersection(other._data)))
+
+    def to_list(self) -> List[str]:
+        """还原为 IP:PORT 字符串列表"""
+        return [unpack_proxy(value) for value in self._data]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._data)
+
+
+class CandidateSet:
+    """
+    紧凑去重集合（流式去重）：主体为有序 array('Q')，每个代理8字节、bisect 查找；
+    新加入的代理先放在小集合中，超过主体的一定比例时归并进主体，内存不随候选数按 Python set 的开销增长
+    """
+
+    def __init__(self, merge_ratio: float = 0.125, min_pending: int = 4096):
+        """
+        :param merge_ratio: 待归并集合超过主体的该比例时归并
+        :param min_pending: 待归并集合的最小容量（主体较小时避免频繁归并）
+        """
+        self.merge_ratio = merge_ratio
+        self.min_pending = min_pending
+        self._sorted = array('Q')
+        self._pending = set()
+
+    def __contains__(self, value: int) -> bool:
+        if value in self._pending:
+            return True
+        i = bisect.bisect_left(self._sorted, value)
+        return i < len(self._sorted) and self._sorted[i] == value
+
+    def add_new(self, values: Iterable[int]) -> List[int]:
+        """加入一批已打包的代理，返回其中此前未出现过的（保持原顺序，批内重复只保留一个）"""
+        new_values = []
+        for value in values:
+            if value not in self:
+                self._pending.add(value)
+                new_values.append(value)
+        if len(self._pending) > max(self.min_pending, len(self._sorted) * self.merge_ratio):
+            self._merge()
+        return new_values
+
+    def _merge(self) -> None:
+        """内部方法：把待归并集合有序归并进主体（逐个生成，不构造整表的临时列表）"""
+        self._sorted = array('Q', heapq.merge(self._sorted, sorted(self._pending)))
+        self._pending = set()
+
+    def clear(self) -> None:
+        """清空集合"""
+        self._sorted = array('Q')
+        self._pending = set()
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._pending)
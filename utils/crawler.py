@@ -1,32 +1,125 @@
+import asyncio
+import functools
+import html as html_lib
 import json
 import re
+import threading
 import time
-from typing import List, Dict, Optional
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urljoin, urlsplit
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils import metrics
+from utils.candidates import CandidateSet, CandidateStore, pack_proxies, pack_proxy, unpack_proxy
+from utils.page_cache import PageCache
+from utils.source_health import SourceHealth
+from utils.table_parser import extract_rows
+
+DEFAULT_PAGE_CONCURRENCY = 4  # 每个源同时请求的页数（未配置 concurrency 时）
+AUTO_MAX_PAGES = 50  # 从HTML分页链接嗅探到的页数上限（未配置 max_pages 时）
+PAGE_MARKER = 918273645  # 构造分页URL模板时使用的占位页码
+
+
+class HostRateLimiter:
+    """按主机限速：同一主机相邻两次请求的间隔不小于该源配置的 delay"""
+
+    def __init__(self):
+        self._locks = {}  # 主机 -> asyncio.Lock
+        self._next_time = {}  # 主机 -> 下次允许请求的时间（事件循环时钟）
+
+    async def wait(self, url: str, delay: float) -> None:
+        """等待直到允许向 url 所在主机发起请求"""
+        host = urlsplit(url).netloc
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        loop = asyncio.get_running_loop()
+        async with lock:
+            wait_time = self._next_time.get(host, 0) - loop.time()
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+            self._next_time[host] = loop.time() + delay
 
 
 class ProxyCrawler:
     """代理IP爬虫类"""
 
-    def __init__(self):
+    def __init__(self, max_workers: int = 32, pool_size: int = 4, retries: int = 2, backoff_factor: float = 0.5,
+                 on_proxies: Optional[Callable[[List[str], dict], None]] = None,
+                 page_cache: Optional[PageCache] = None, source_health: Optional[SourceHealth] = None):
+        """
+        :param max_workers: 执行阻塞请求的线程数
+        :param pool_size: 每个主机保持的长连接数
+        :param retries: 连接错误/5xx/429 时的重试次数
+        :param backoff_factor: 重试退避系数（第n次重试前等待 backoff_factor * 2^(n-1) 秒）
+        :param on_proxies: 每页解析完成后的回调，参数为本页首次出现的代理列表与代理源配置（流式交给验证器）
+        :param page_cache: 页面缓存（条件请求 + 内容哈希，未变化的页面复用上次的候选代理），为空时每次完整下载解析
+        :param source_health: 源健康度与熔断（熔断中的源跳过，到期后只请求1页探测），为空时每轮爬取全部源
+        """
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/87.0.4280.88 Safari/537.36"
         }
-        self.proxies = []  # 存储爬取的代理IP
-
-    def fetch(self, url: str, timeout: int = 5, post_data: Optional[Dict] = None) -> str:
-        """请求页面，返回源码（支持GET/POST）"""
+        self.proxies = CandidateStore()  # 存储爬取的代理IP（整数打包）
+        self.on_proxies = on_proxies
+        self.page_cache = page_cache
+        self.source_health = source_health
+        self.breaker_skipped = set()  # 本轮因熔断跳过的源（id(源配置)）
+        self._seen = CandidateSet()  # 本轮已推送过的代理（打包整数，流式去重）
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)  # 执行阻塞请求的线程池
+        self._sessions = {}  # 主机 -> requests.Session（复用 keep-alive 连接）
+        self._sessions_lock = threading.Lock()
+
+    def _get_session(self, url: str) -> requests.Session:
+        """内部方法：获取 url 所在主机的会话，跨分页与跨轮次复用连接"""
+        host = urlsplit(url).netloc
+        with self._sessions_lock:
+            session = self._sessions.get(host)
+            if session is None:
+                retry = Retry(
+                    total=self.retries,
+                    backoff_factor=self.backoff_factor,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=None,  # POST 分页接口同样允许重试
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+                session = requests.Session()
+                session.headers.update(self.headers)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = session
+            return session
+
+    def close(self) -> None:
+        """关闭所有主机会话与请求线程池"""
+        with self._sessions_lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+        self._executor.shutdown(wait=False)
+
+    def _request(self, url: str, timeout: int = 5, post_data: Optional[Dict] = None,
+                 headers: Optional[Dict] = None) -> Optional[requests.Response]:
+        """内部方法：发起请求（支持GET/POST与附加请求头，同一主机复用连接池），失败时返回 None"""
         try:
+            session = self._get_session(url)
             if post_data:
-                response = requests.post(url, headers=self.headers, data=post_data, timeout=timeout)
-            else:
-                response = requests.get(url, headers=self.headers, timeout=timeout)
-            return response.text
+                return session.post(url, data=post_data, timeout=timeout, headers=headers)
+            return session.get(url, timeout=timeout, headers=headers)
         except Exception as e:
             print(f"❌ [请求失败] {url}：{str(e)[:50]}")
-            return ""
+            return None
+
+    def fetch(self, url: str, timeout: int = 5, post_data: Optional[Dict] = None) -> str:
+        """请求页面，返回源码（支持GET/POST，同一主机复用连接池）"""
+        response = self._request(url, timeout, post_data)
+        return response.text if response is not None else ""
 
     @staticmethod
     def parse_api1(html: str) -> List[str]:
@@ -77,33 +170,26 @@ class ProxyCrawler:
     @staticmethod
     def parse_html1(html: str) -> List[str]:
         """解析HTML，IP+端口在同一个td标签"""
-        soup = BeautifulSoup(html, 'html5lib')
-        trs = soup.find_all('tr')
-        return [tr.find_all('td')[0].text.strip() for tr in trs[1:]]
+        rows = extract_rows(html)
+        return [row['td'][0].strip() for row in rows[1:]]
 
     @staticmethod
     def parse_html2(html: str) -> List[str]:
         """解析HTML，IP在第1个td，端口在第2个td"""
-        soup = BeautifulSoup(html, 'html5lib')
-        trs = soup.find_all('tr')
-        return [f"{tr.find_all('td')[0].text.strip()}:{tr.find_all('td')[1].text.strip()}"
-                for tr in trs[1:]]
+        rows = extract_rows(html)
+        return [f"{row['td'][0].strip()}:{row['td'][1].strip()}" for row in rows[1:]]
 
     @staticmethod
     def parse_html3(html: str) -> List[str]:
         """解析HTML，IP在第2个td，端口在第3个td"""
-        soup = BeautifulSoup(html, 'html5lib')
-        trs = soup.find_all('tr')
-        return [f"{tr.find_all('td')[1].text.strip()}:{tr.find_all('td')[2].text.strip()}"
-                for tr in trs[1:]]
+        rows = extract_rows(html)
+        return [f"{row['td'][1].strip()}:{row['td'][2].strip()}" for row in rows[1:]]
 
     @staticmethod
     def parse_html4(html: str) -> List[str]:
         """解析HTML，IP在第1个th，端口在第2个th"""
-        soup = BeautifulSoup(html, 'html5lib')
-        trs = soup.find_all('tr')
-        return [f"{tr.find_all('th')[0].text.strip()}:{tr.find_all('th')[1].text.strip()}"
-                for tr in trs[1:]]
+        rows = extract_rows(html)
+        return [f"{row['th'][0].strip()}:{row['th'][1].strip()}" for row in rows[1:]]
 
     @staticmethod
     def parse_fpslist(html: str) -> List[str]:
@@ -154,10 +240,9 @@ class ProxyCrawler:
 
         return result
 
-    def _get_auto_page_count(self, url: str) -> int:
-        """内部方法：自动获取api2总页数"""
-        first_page_url = url + "1" if url.endswith("page=") else url
-        html = self.fetch(first_page_url)
+    @staticmethod
+    def _get_auto_page_count(html: str) -> int:
+        """内部方法：从api2第1页的响应中读取总页数（复用第1页响应，不再单独请求）"""
         if not html:
             print("❌ [自动分页] 获取总页数失败")
             return 1
@@ -174,148 +259,257 @@ class ProxyCrawler:
             print("❌ [自动分页] 解析总页数失败")
             return 1
 
+    @staticmethod
+    def _sniff_page_count(html: str, source: dict) -> int:
+        """
+        内部方法：从HTML分页链接中嗅探总页数
+        只统计除页码外与该源分页URL完全一致的链接（同一主机、路径与其余查询参数），
+        指向其他列表（如 ip3366 的另一个 stype）的分页链接不计入
+        """
+        marker = str(PAGE_MARKER)
+        url, _ = ProxyCrawler._build_page_request(source, PAGE_MARKER)
+        if not html or marker not in url:
+            return 1  # 页码不在URL中（如POST分页、单页接口），无法从链接嗅探
+        template = urlsplit(url)
+        if marker in template.query:
+            # 查询参数分页：?stype=1&page=N，页码参数之外的参数须完全相同
+            template_query = dict(parse_qsl(template.query, keep_blank_values=True))
+            page_key = next(key for key, value in template_query.items() if value == marker)
+            del template_query[page_key]
+            path_pattern = None
+        else:
+            # 路径分页：/free/intr/N 或 /dailiip/2/N.html（末尾的 / 可有可无，如 kuaidaili 的 /free/intr/2/）
+            prefix, suffix = template.path.split(marker, 1)
+            path_pattern = re.compile(re.escape(prefix) + r"(\d+)" + re.escape(suffix.rstrip("/")) + "/?")
+
+        pages = []
+        for href in re.findall(r"""href\s*=\s*["']?([^"'\s>]+)""", html, re.IGNORECASE):
+            link = urlsplit(urljoin(url, html_lib.unescape(href)))
+            if link.netloc.lower() != template.netloc.lower():
+                continue
+            if path_pattern is None:
+                if link.path.rstrip("/") != template.path.rstrip("/"):
+                    continue
+                query = dict(parse_qsl(link.query, keep_blank_values=True))
+                page = query.pop(page_key, "")
+                if page.isdigit() and query == template_query:
+                    pages.append(int(page))
+            else:
+                match = path_pattern.fullmatch(link.path)
+                if match and link.query == template.query:
+                    pages.append(int(match.group(1)))
+        if not pages:
+            print(f"⚠️  [{source['name']}] 未找到与分页URL匹配的分页链接，按单页处理")
+        page_count = max(pages, default=1)
+        return max(1, min(page_count, source.get("max_pages", AUTO_MAX_PAGES)))
+
     def _is_valid_proxy(self, proxy: str) -> bool:
-        """内部方法：校验代理IP:PORT的合法性"""
-        if not proxy or ':' not in proxy:
-            return False
-        ip, port_str = proxy.split(':', 1)  # 分割IP和端口（仅分割一次，避免端口含:）
-
-        # 1. IP合法性校验（IPv4：四段数字，每段0-255）
-        ip_segments = ip.split('.')
-        if len(ip_segments) != 4:
-            return False
-        try:
-            ip_nums = [int(seg) for seg in ip_segments]
-            if not all(0 <= num <= 255 for num in ip_nums):
-                return False
-        except ValueError:
-            return False
+        """内部方法：校验代理IP:PORT的合法性（IPv4每段0-255，端口1-65535）"""
+        return pack_proxy(proxy) is not None
 
-        # 2. 端口合法性校验（1-65535，支持数字字符串）
-        try:
-            port = int(port_str.strip())
-            if not (1 <= port <= 65535):
-                return False
-        except ValueError:
-            return False
+    @staticmethod
+    def _build_page_request(source: dict, current_page: int) -> Tuple[str, Optional[Dict]]:
+        """内部方法：构建指定页码的请求URL与POST数据"""
+        if "api1" in source['parser']:
+            url = source['url']
+        elif source['parser'] in ["fineproxy"]:
+            url = source['url']
+        elif any(domain in source['url'] for domain in ["kxdaili.com", "qiyunip.com"]):
+            url = f"{source['url']}{current_page}.html"
+        else:
+            url = f"{source['url']}{current_page}"
+
+        # 处理POST数据
+        post_data = source.get("body") or None
+        if post_data and isinstance(post_data, dict):
+            post_data = {k: v.replace("{page}", str(current_page)) if "{page}" in str(v) else v
+                         for k, v in post_data.items()}
+        return url, post_data
+
+    async def _load_page(self, parser: Callable[[str], List[str]], source: dict, page: int, total_pages,
+                         limiter: HostRateLimiter) -> Tuple[array, Optional[int]]:
+        """
+        内部方法：按主机限速后请求并解析指定页码
+        配置了页面缓存时发送条件请求，页面未变化（304 或响应体哈希相同）时跳过解析、复用上次的候选代理
+        :return: (本页校验通过的打包代理, auto 分页时第1页得到的总页数，其余情况为 None)
+        """
+        name = source['name']
+        url, post_data = self._build_page_request(source, page)
+        key = PageCache.make_key(url, post_data)
+        entry = self.page_cache.get(key, source['parser']) if self.page_cache else None
+        auto_count = page == 1 and source['pages'] == "auto"
+        if entry and auto_count and entry["page_count"] is None:
+            entry = None  # 缓存中没有总页数（源配置改为 auto），重新解析
+        headers = self.page_cache.conditional_headers(key, source['parser']) if entry else None
+
+        await limiter.wait(url, source['delay'])
+        print(f"🔄 [{name}] 正在爬取 | 页码：{page:2d}/{total_pages:>2} | URL：{url}")
+        loop = asyncio.get_running_loop()
+        start_time = time.perf_counter()
+        response = await loop.run_in_executor(
+            self._executor, functools.partial(self._request, url, post_data=post_data, headers=headers))
+        elapsed = time.perf_counter() - start_time
+        metrics.SOURCE_FETCH_SECONDS.observe(elapsed, source=name)
+        if self.source_health:
+            self.source_health.record_page(source, response is not None and response.ok, elapsed)
+        if response is None:
+            metrics.SOURCE_PAGES.inc(source=name, result="failed")
+            return self._parse_page(parser, source, page, ""), None
+        metrics.SOURCE_BYTES.inc(len(response.content), source=name)
+
+        if entry and (response.status_code == 304 or PageCache.body_hash(response.content) == entry["hash"]):
+            self.page_cache.touch(key)
+            metrics.SOURCE_PAGES.inc(source=name, result="cached")
+            reason = "304" if response.status_code == 304 else "内容相同"
+            print(f"♻️  [{name}] 页码 {page:2d} | 页面未变化（{reason}），复用上次结果：{len(entry['candidates']):2d} 个")
+            return array('Q', entry["candidates"]), entry["page_count"] if auto_count else None
+
+        html = response.text
+        # 仅在第1页显示预览
+        if page == 1 and html:
+            preview = html[:500].replace('\n', ' ').strip()  # 去除换行，精简显示
+            print(f"📄 [{name}] 响应预览：{preview}...")
+
+        page_count = None
+        if auto_count:
+            if source['parser'] == "api2":
+                page_count = self._get_auto_page_count(html)
+                print(f"ℹ️ [{name}] 自动获取总页数：{page_count} 页")
+            else:
+                page_count = self._sniff_page_count(html, source)
+                print(f"ℹ️ [{name}] 从分页链接嗅探总页数：{page_count} 页")
 
-        return True
+        metrics.SOURCE_PAGES.inc(source=name, result="ok" if response.ok and html else "failed")
+        valid_ips = self._parse_page(parser, source, page, html)
+        if self.page_cache and response.ok and html:
+            self.page_cache.put(key, source['parser'], response.headers.get("ETag"),
+                                response.headers.get("Last-Modified"), PageCache.body_hash(response.content),
+                                valid_ips.tolist(), page_count)
+        return valid_ips, page_count
 
-    def crawl(self, source: dict) -> int:
-        """爬取指定源的代理IP"""
+    @staticmethod
+    def _parse_page(parser: Callable[[str], List[str]], source: dict, page: int, html: str) -> array:
+        """内部方法：解析单页响应，返回校验通过的打包代理（请求失败时为空）"""
+        name = source['name']
+        if not html:
+            print(f"⚠️  [{name}] 页码 {page:2d} | 请求失败，跳过")
+            return array('Q')
+        start_time = time.perf_counter()
+        ips = parser(html)
+        valid_ips = pack_proxies(ips)  # 批量校验并打包
+        metrics.SOURCE_PARSE_SECONDS.observe(time.perf_counter() - start_time, source=name)
+        metrics.SOURCE_CANDIDATES.inc(len(ips), source=name)
+        metrics.SOURCE_VALID_FORMAT.inc(len(valid_ips), source=name)
+        print(f"✅  [{name}] 页码 {page:2d} | 提取IP：{len(ips):2d} 个 | 有效格式：{len(valid_ips):2d} 个")
+        return valid_ips
+
+    async def crawl_async(self, source: dict, limiter: Optional[HostRateLimiter] = None) -> int:
+        """
+        异步爬取指定源的代理IP
+        先请求第1页（auto 分页时从中读取总页数），其余页按 concurrency 分批并发请求，
+        同一主机的请求间隔仍由 limiter 按 delay 控制
+        """
         parser = getattr(self, f"parse_{source['parser']}", None)
         if not parser:
             print(f"❌ [爬虫错误] 未知解析器：{source['parser']}")
             return 0
 
-        # 分隔符
-        source_name = source['name'].center(30, ' ')
-        print(f"\n{'=' * 80}")
-        print(f"📥 开始爬取 | {source_name}")
-        print(f"{'=' * 80}")
+        limiter = limiter or HostRateLimiter()
+        name = source['name']
+        breaker_state = self.source_health.allow(source) if self.source_health else "closed"
+        if breaker_state is None:
+            print(f"⛔ 跳过爬取 | {name} | 熔断中（{self.source_health.remaining(source) / 60:.0f} 分钟后探测）")
+            self.breaker_skipped.add(id(source))
+            return 0
+        concurrency = max(1, source.get("concurrency", DEFAULT_PAGE_CONCURRENCY))
+        print(f"📥 开始爬取 | {name}")
 
-        temp_proxies = []
+        temp_proxies = array('Q')
         no_data_count = 0
-        before_count = len(self.proxies)
+        crawl_count = 0
         try:
-            # 处理分页配置
+            # 第1页：auto 分页时从中得到总页数
+            valid_ips, page_count = await self._load_page(parser, source, 1, source['pages'], limiter)
             if source['pages'] == "auto":
-                if source['parser'] != "api2":
-                    print("⚠️ [分页警告] 仅api2支持自动分页，默认爬1页")
-                    total_pages = 1
-                else:
-                    total_pages = self._get_auto_page_count(source['url'])
-                    print(f"ℹ️ [分页信息] 自动获取总页数：{total_pages} 页")
+                total_pages = page_count or 1  # 第1页请求失败时按1页处理
             else:
                 total_pages = source['pages']
-                print(f"ℹ️ [分页信息] 配置爬取页数：{total_pages} 页")
-
-            # 分页爬取
-            for current_page in range(1, total_pages + 1):
-                # 构建请求URL
-                if "api1" in source['parser']:
-                    url = source['url']
-                elif source['parser'] in ["fineproxy"]:
-                    url = source['url']
-                elif any(domain in source['url'] for domain in ["kxdaili.com", "qiyunip.com"]):
-                    url = f"{source['url']}{current_page}.html"
-                else:
-                    url = f"{source['url']}{current_page}"
-
-                # 处理POST数据
-                post_data = source.get("body") or None
-                if post_data and isinstance(post_data, dict):
-                    post_data = {k: v.replace("{page}", str(current_page)) if "{page}" in str(v) else v
-                                 for k, v in post_data.items()}
-
-                # 分页日志
-                print(f"\n🔄 正在爬取 | 页码：{current_page:2d}/{total_pages:2d} | URL：{url}")
-                print(f"ℹ️  当前累计 | 总列表IP数：{len(self.proxies):3d} 个")
-
-                html = self.fetch(url, post_data=post_data)
-
-                # 仅在第1页显示预览
-                if current_page == 1 and html:
-                    preview = html[:500].replace('\n', ' ').strip()  # 去除换行，精简显示
-                    print(f"📄 响应预览：{preview}...")
-
-                if not html:
-                    print(f"⚠️  页码 {current_page:2d} | 请求失败，跳过")
-                    no_data_count += 1
-                else:
-                    ips = parser(html)
-                    valid_ips = [ip for ip in ips if self._is_valid_proxy(ip)]  # 校验结果
-                    page_valid_count = len(valid_ips)
-
-                    # 分页结果日志
-                    print(f"✅  页码 {current_page:2d} | 提取IP：{len(ips):2d} 个 | 有效格式：{page_valid_count:2d} 个")
-
+                print(f"ℹ️ [{name}] 配置爬取页数：{total_pages} 页")
+            if breaker_state == "half_open":
+                total_pages = 1
+                print(f"🔎 [{name}] 熔断到期，仅请求第1页探测")
+
+            # 按页码顺序处理结果（连续无数据的判断与顺序爬取一致），每批并发请求 concurrency 页
+            pending = [(1, valid_ips)]
+            next_page = 2
+            while pending:
+                for current_page, valid_ips in pending:
                     temp_proxies.extend(valid_ips)
-                    no_data_count = 0 if page_valid_count > 0 else no_data_count + 1
-
-                    if page_valid_count == 0:
-                        print(f"⚠️  页码 {current_page:2d} | 无有效IP，连续无数据次数：{no_data_count}")
+                    self._emit_new(valid_ips, source)
+                    no_data_count = 0 if valid_ips else no_data_count + 1
+                    if not valid_ips:
+                        print(f"⚠️  [{name}] 页码 {current_page:2d} | 无有效IP，连续无数据次数：{no_data_count}")
+                    if no_data_count >= 3:
+                        break
 
                 # 连续3次无数据停止
                 if no_data_count >= 3:
-                    print(f"\n🛑 [爬取停止] 连续3次无有效IP，提前结束当前源爬取")
+                    print(f"🛑 [{name}] 连续3次无有效IP，提前结束当前源爬取")
                     break
 
-                time.sleep(source['delay'])
+                batch = range(next_page, min(next_page + concurrency, total_pages + 1))
+                results = await asyncio.gather(*(self._load_page(parser, source, page, total_pages, limiter)
+                                                 for page in batch))
+                pending = [(page, valid_ips) for page, (valid_ips, _) in zip(batch, results)]
+                next_page = batch.stop
 
             # 爬取完成统计
             self.proxies.extend(temp_proxies)
             crawl_count = len(temp_proxies)
-            after_count = len(self.proxies)
-            print(f"\n{'=' * 80}")
-            print(f"✅ 爬取完成 | {source['name']}")
-            print(f"   ├─ 本源性新增有效IP：{crawl_count:3d} 个")
-            print(f"   ├─ 总列表累计IP数：{after_count:3d} 个")
-            print(f"   └─ 本次新增量：{after_count - before_count:3d} 个")
-            print(f"{'=' * 80}")
+            print(f"✅ 爬取完成 | {name} | 本源新增有效IP：{crawl_count:3d} 个 | 总列表累计：{len(self.proxies):3d} 个")
 
         except Exception as e:
-            print(f"\n{'=' * 80}")
-            print(f"❌ 爬取失败 | {source['name']}")
-            print(f"   ├─ 失败原因：{str(e)[:50]}")
-            valid_temp = [ip for ip in temp_proxies if re.match(r'\d+\.\d+\.\d+\.\d+:\d+', ip)]
-            crawl_count = len(valid_temp)
-            if valid_temp:
-                self.proxies.extend(valid_temp)
-                after_count = len(self.proxies)
-                print(f"   ├─ 异常恢复：已累计有效IP {crawl_count:3d} 个")
-                print(f"   └─ 总列表当前累计：{after_count:3d} 个")
-            print(f"{'=' * 80}")
-
+            print(f"❌ 爬取失败 | {name} | 失败原因：{str(e)[:50]}")
+            crawl_count = len(temp_proxies)  # 已累计的均为校验通过的代理
+            if temp_proxies:
+                self.proxies.extend(temp_proxies)
+                print(f"   └─ 异常恢复：已累计有效IP {crawl_count:3d} 个（总列表当前累计：{len(self.proxies):3d} 个）")
+
+        if self.source_health:
+            self.source_health.record_crawl(source, crawl_count)
         return crawl_count
 
-    def get_unique_proxies(self) -> List[str]:
-        """代理IP去重（优化日志显示）"""
+    def _emit_new(self, packed: array, source: dict) -> None:
+        """内部方法：将本轮首次出现的代理推送给 on_proxies 回调"""
+        if not self.on_proxies:
+            return
+        new_values = self._seen.add_new(packed)  # 保持页面中的出现顺序
+        if new_values:
+            self.on_proxies([unpack_proxy(value) for value in new_values], source)
+
+    async def crawl_all_async(self, sources: List[dict], limiter: Optional[HostRateLimiter] = None) -> int:
+        """并发爬取多个代理源，返回本次新增有效IP总数"""
+        limiter = limiter or HostRateLimiter()
+        self.breaker_skipped.clear()
+        counts = await asyncio.gather(*(self.crawl_async(source, limiter) for source in sources))
+        return sum(counts)
+
+    def crawl(self, source: dict) -> int:
+        """爬取指定源的代理IP"""
+        return asyncio.run(self.crawl_async(source))
+
+    def crawl_all(self, sources: List[dict]) -> int:
+        """并发爬取多个代理源（耗时取决于最慢的源，而非所有源之和）"""
+        return asyncio.run(self.crawl_all_async(sources))
+
+    def get_unique_candidates(self) -> CandidateStore:
+        """代理IP去重，返回整数打包的有序存储（优化日志显示）"""
         before_count = len(self.proxies)
-        unique_list = list(set(self.proxies))
-        after_count = len(unique_list)
+        unique_store = self.proxies.unique()
+        after_count = len(unique_store)
         duplicate_count = before_count - after_count
         self.proxies.clear()
+        self._seen.clear()
 
         # 计算重复率（处理除以0）
         duplicate_rate = (duplicate_count / before_count) * 100 if before_count != 0 else 0.0
@@ -329,4 +523,8 @@ class ProxyCrawler:
         print(f"   └─ 重复率：{duplicate_rate:6.2f}%")
         print(f"{'=' * 60}")
 
-        return unique_list
+        return unique_store
+
+    def get_unique_proxies(self) -> List[str]:
+        """代理IP去重，返回 IP:PORT 字符串列表"""
+        return self.get_unique_candidates().to_list()
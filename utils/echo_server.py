@@ -0,0 +1,67 @@
+"""
+回显服务：返回请求来源IP与请求头（与 httpbin.org/get 的 origin/headers 字段兼容），用于判断代理匿名度。
+可部署在自己的公网服务器上替代第三方回显接口：python -m utils.echo_server --host 0.0.0.0 --port 8080
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """回显请求：{"origin": 来源IP, "headers": {请求头}}"""
+
+    def do_GET(self) -> None:
+        body = json.dumps({"origin": self.client_address[0], "headers": dict(self.headers.items())}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        """关闭默认的逐请求访问日志"""
+        pass
+
+
+class EchoServer:
+    """回显服务：在后台线程中运行"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080):
+        self.host = host
+        self.port = port
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        """回显接口地址"""
+        return f"http://{self.host}:{self.port}/get"
+
+    def start(self) -> None:
+        """启动服务（后台线程）"""
+        self._server = ThreadingHTTPServer((self.host, self.port), EchoHandler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]  # port=0 时取实际分配的端口
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        """停止服务"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FreeProxyPool 回显服务（代理匿名度检测）")
+    parser.add_argument("--host", default="0.0.0.0", help="监听地址")
+    parser.add_argument("--port", type=int, default=8080, help="监听端口")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), EchoHandler)
+    print(f"🌐 [回显服务] 已启动：http://{args.host}:{args.port}/get")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+离线 IP 归属（国家/ASN）查询：把本地 IP 段数据库加载为按起始地址排序的整数数组，每次查询一次二分查找。
+
+支持的数据库为 CSV/TSV（可为 .gz 压缩），每行一个 IPv4 段，起止地址可以是点分格式或整数，例如 iptoasn.com 的
+ip2asn-v4.tsv：range_start  range_end  AS_number  country_code  AS_description
+"""
+import bisect
+import csv
+import gzip
+import ipaddress
+from array import array
+from typing import Dict, Optional, Sequence
+
+from utils.candidates import pack_proxy
+
+DEFAULT_COLUMNS = ("start", "end", "asn", "country", "as_name")  # ip2asn-v4.tsv 的列顺序
+
+
+def _parse_ip(value: str) -> int:
+    """内部方法：点分IPv4或整数字符串转为整数"""
+    value = value.strip()
+    return int(value) if value.isdigit() else int(ipaddress.IPv4Address(value))
+
+
+class GeoIndex:
+    """IP段索引：起止地址、ASN、国家、AS名称分别存放在紧凑数组中（每段18字节），国家与AS名称去重后按编号引用"""
+
+    def __init__(self, filename: str, columns: Sequence[str] = DEFAULT_COLUMNS, delimiter: Optional[str] = None):
+        """
+        :param filename: IP段数据库文件（.csv/.tsv，可带 .gz）
+        :param columns: 各列含义，须包含 start/end，可选 country/asn/as_name，其余列名忽略
+        :param delimiter: 分隔符，为空时 .tsv 文件用制表符，其他用逗号
+        """
+        self.filename = filename
+        self.columns = tuple(columns)
+        if delimiter is None:
+            delimiter = "\t" if filename.endswith((".tsv", ".tsv.gz")) else ","
+        self.delimiter = delimiter
+        self._starts = array("I")
+        self._ends = array("I")
+        self._asns = array("I")
+        self._countries = array("H")  # 国家编号（0 为未知）
+        self._as_names = array("I")  # AS名称编号（0 为未知）
+        self._country_names = [""]
+        self._as_name_list = [""]
+        self.load()
+
+    @staticmethod
+    def _intern(names: list, lookup: Dict[str, int], value: str) -> int:
+        """内部方法：字符串去重，返回编号"""
+        if not value:
+            return 0
+        index = lookup.get(value)
+        if index is None:
+            index = lookup[value] = len(names)
+            names.append(value)
+        return index
+
+    def _read_rows(self, f):
+        """内部方法：逐行解析CSV（文件内容非文本CSV时统一抛出 ValueError）"""
+        reader = csv.reader(f, delimiter=self.delimiter)
+        try:
+            yield from reader
+        except csv.Error as e:
+            raise ValueError(f"第 {reader.line_num} 行无法解析：{e}") from e
+
+    def load(self) -> None:
+        """加载数据库（格式错误的行与表头跳过），按起始地址排序；文件无法读取时抛出 OSError，非 UTF-8 文本CSV时抛出 ValueError"""
+        column_index = {name: i for i, name in enumerate(self.columns)}
+        rows = []
+        country_lookup, as_name_lookup = {}, {}
+        opener = gzip.open if self.filename.endswith(".gz") else open
+        with opener(self.filename, "rt", encoding="utf-8", newline="") as f:
+            for fields in self._read_rows(f):
+                try:
+                    start = _parse_ip(fields[column_index["start"]])
+                    end = _parse_ip(fields[column_index["end"]])
+                    asn = int(fields[column_index["asn"]]) if "asn" in column_index else 0
+                except (IndexError, ValueError):
+                    continue
+                country = fields[column_index["country"]].strip().upper() if "country" in column_index else ""
+                as_name = fields[column_index["as_name"]].strip() if "as_name" in column_index else ""
+                if country in ("NONE", "ZZ", "-"):
+                    country = ""
+                rows.append((start, end, asn,
+                             self._intern(self._country_names, country_lookup, country),
+                             self._intern(self._as_name_list, as_name_lookup, as_name)))
+        rows.sort()
+        self._starts = array("I", (row[0] for row in rows))
+        self._ends = array("I", (row[1] for row in rows))
+        self._asns = array("I", (row[2] for row in rows))
+        self._countries = array("H", (row[3] for row in rows))
+        self._as_names = array("I", (row[4] for row in rows))
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def lookup(self, proxy: str) -> Optional[Dict]:
+        """
+        查询代理（IP:PORT 或 IP）的归属
+        :return: {"country", "asn", "as_name"}（未知字段为 None），不在任何段内时返回 None
+        """
+        key = pack_proxy(proxy if ":" in proxy else f"{proxy}:1")
+        if key is None:
+            return None
+        ip = key >> 16
+        i = bisect.bisect_right(self._starts, ip) - 1
+        if i < 0 or ip > self._ends[i]:
+            return None
+        return {
+            "country": self._country_names[self._countries[i]] or None,
+            "asn": self._asns[i] or None,
+            "as_name": self._as_name_list[self._as_names[i]] or None
+        }
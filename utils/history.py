@@ -0,0 +1,114 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from utils.storage import ProxyStorage
+
+
+class ProxyHistory:
+    """代理历史记录：持久化每个代理的出现/成功时间、连续失败次数与来源，用于增量验证"""
+
+    def __init__(self, filename: str = "proxy_history.json", base_backoff: int = 3600,
+                 max_backoff: int = 7 * 24 * 3600, expire_seconds: int = 7 * 24 * 3600):
+        """
+        :param filename: 历史记录文件
+        :param base_backoff: 首次失败后的跳过时长（秒），之后每连续失败一次翻倍
+        :param max_backoff: 跳过时长上限（秒）
+        :param expire_seconds: 超过该时长未再出现且未成功的代理从记录中清除
+        """
+        self.filename = filename
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.expire_seconds = expire_seconds
+        self.records = {}  # 代理 -> 历史记录
+        self.load()
+
+    def load(self) -> None:
+        """从文件加载历史记录（文件不存在或损坏时从空记录开始）"""
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                self.records = json.load(f).get("records", {})
+        except (OSError, ValueError) as e:
+            print(f"⚠️ [历史记录] 加载失败，重新记录：{str(e)[:50]}")
+            self.records = {}
+
+    def save(self) -> None:
+        """清理过期记录并保存到文件"""
+        now = time.time()
+        self.records = {
+            proxy: record for proxy, record in self.records.items()
+            if now - max(record["last_seen"], record["last_success"]) < self.expire_seconds
+        }
+        ProxyStorage.write_json_atomic(self.filename, {"update_time": now, "records": self.records}, indent=None)
+
+    def _get_record(self, proxy: str) -> Dict:
+        """内部方法：获取（不存在则创建）代理的历史记录"""
+        record = self.records.get(proxy)
+        if record is None:
+            record = self.records[proxy] = {
+                "source": "",
+                "type": "normal",
+                "last_seen": 0,
+                "last_checked": 0,
+                "last_success": 0,
+                "fail_count": 0,  # 连续失败次数
+                "check_count": 0,  # 累计验证次数
+                "success_count": 0  # 累计成功次数
+            }
+        return record
+
+    def record_seen(self, proxy: str, source: str, type_tag: str) -> None:
+        """记录代理在某个代理源中出现"""
+        record = self._get_record(proxy)
+        record["source"] = source
+        record["last_seen"] = time.time()
+        if type_tag == "anonymous":
+            record["type"] = type_tag
+
+    def record_type(self, proxy: str, type_tag: str) -> None:
+        """记录实测的代理类型（匿名度检测结果，覆盖代理源标注）"""
+        self._get_record(proxy)["type"] = type_tag
+
+    def record_result(self, proxy: str, is_valid: bool) -> None:
+        """记录一次验证结果"""
+        record = self._get_record(proxy)
+        now = time.time()
+        record["last_checked"] = now
+        record["check_count"] = record.get("check_count", 0) + 1
+        if is_valid:
+            record["success_count"] = record.get("success_count", 0) + 1
+            record["last_success"] = now
+            record["fail_count"] = 0
+        else:
+            record["fail_count"] += 1
+
+    def should_check(self, proxy: str, now: Optional[float] = None) -> bool:
+        """判断代理是否需要验证：连续失败的代理按指数退避跳过"""
+        record = self.records.get(proxy)
+        if not record or record["fail_count"] == 0:
+            return True
+        backoff = min(self.base_backoff * 2 ** (record["fail_count"] - 1), self.max_backoff)
+        return (now or time.time()) >= record["last_checked"] + backoff
+
+    def reliability(self, proxy: str) -> float:
+        """历史成功率（拉普拉斯平滑，新代理为0.5）"""
+        record = self.records.get(proxy, {})
+        return (record.get("success_count", 0) + 1) / (record.get("check_count", 0) + 2)
+
+    def score(self, proxy: str, total_ms: float) -> float:
+        """综合评分（0-100）：历史成功率 × 延迟因子，1秒总耗时对应延迟因子0.5"""
+        return round(100 * self.reliability(proxy) / (1 + total_ms / 1000), 2)
+
+    def get_type(self, proxy: str) -> str:
+        """获取代理的历史类型（normal/anonymous）"""
+        record = self.records.get(proxy)
+        return record["type"] if record else "normal"
+
+    def known_good(self) -> List[str]:
+        """上次验证成功的代理，按最近成功时间倒序（优先复检）"""
+        good = [proxy for proxy, record in self.records.items()
+                if record["last_success"] and record["fail_count"] == 0]
+        return sorted(good, key=lambda proxy: self.records[proxy]["last_success"], reverse=True)
@@ -0,0 +1,190 @@
+import collections
+import random
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from utils import metrics
+
+STRATEGIES = ("weighted", "lru")
+
+
+class ProxyLeasePool:
+    """
+    代理租用池：由每轮验证后的有效代理整体替换，按评分加权随机或最久未用（LRU）分配代理并发放带过期时间的租约。
+    使用方归还时上报成功/失败，每个代理保留最近若干次结果（滑动窗口）：健康度计入选取权重，
+    窗口内失败过多的代理暂停分配一段时间，不必等下一轮验证。
+    """
+
+    def __init__(self, lease_seconds: float = 60, max_lease_seconds: float = 3600, max_leases_per_proxy: int = 1,
+                 window: int = 20, min_samples: int = 3, min_health: float = 0.5, bench_seconds: float = 600):
+        """
+        :param lease_seconds: 默认租约时长（秒），到期未归还的租约自动回收
+        :param max_lease_seconds: 租约时长上限（秒）
+        :param max_leases_per_proxy: 同一代理同时发放的租约数上限（1 为独占）
+        :param window: 每个代理保留的最近反馈次数
+        :param min_samples: 窗口内反馈少于该次数时不暂停代理
+        :param min_health: 窗口内成功率低于该值时暂停分配
+        :param bench_seconds: 暂停分配的时长（秒），到期后清空窗口重新计算
+        """
+        self.lease_seconds = lease_seconds
+        self.max_lease_seconds = max_lease_seconds
+        self.max_leases_per_proxy = max_leases_per_proxy
+        self.window = window
+        self.min_samples = min_samples
+        self.min_health = min_health
+        self.bench_seconds = bench_seconds
+        self._entries = {}  # 代理 -> 类型、评分与归属（来自最近一轮验证）
+        self._states = {}  # 代理 -> {"results": 最近反馈, "last_used", "active", "benched_until"}
+        self._leases = {}  # 租约ID -> {"proxy", "expires_at"}
+        self._lock = threading.Lock()
+
+    def update(self, entries: List[Dict]) -> None:
+        """用新一轮的有效代理替换可分配集合（保留仍在池中的代理的健康记录与未到期的租约）"""
+        with self._lock:
+            self._entries = {entry["proxy"]: entry for entry in entries}
+            for proxy in list(self._states):
+                if proxy not in self._entries and not self._states[proxy]["active"]:
+                    del self._states[proxy]
+
+    def upsert(self, entry: Dict) -> None:
+        """加入/刷新单个有效代理（本轮验证通过时即时加入，不必等本轮结束）"""
+        with self._lock:
+            self._entries[entry["proxy"]] = entry
+
+    def remove(self, proxy: str) -> bool:
+        """移出可分配集合（如经 /delete 上报失效），下一轮 update() 时若仍有效则恢复；已发放的租约不受影响"""
+        with self._lock:
+            return self._entries.pop(proxy, None) is not None
+
+    def _state(self, proxy: str) -> Dict:
+        """内部方法：获取（不存在则创建）代理的租用状态"""
+        state = self._states.get(proxy)
+        if state is None:
+            state = self._states[proxy] = {
+                "results": collections.deque(maxlen=self.window),
+                "last_used": 0.0,
+                "active": 0,  # 未归还的租约数
+                "benched_until": 0.0
+            }
+        return state
+
+    @staticmethod
+    def _health(state: Optional[Dict]) -> float:
+        """内部方法：窗口内成功率（拉普拉斯平滑，无反馈时为1）"""
+        if not state or not state["results"]:
+            return 1.0
+        return (sum(state["results"]) + 1) / (len(state["results"]) + 1)
+
+    def _reap(self, now: float) -> None:
+        """内部方法：回收到期未归还的租约（不计入健康度）"""
+        expired = [lease_id for lease_id, lease in self._leases.items() if lease["expires_at"] <= now]
+        for lease_id in expired:
+            lease = self._leases.pop(lease_id)
+            state = self._states.get(lease["proxy"])
+            if state:
+                state["active"] -= 1
+        if expired:
+            metrics.LEASES.inc(len(expired), result="expired")
+            metrics.LEASES_ACTIVE.set(len(self._leases))
+
+    def checkout(self, type_tag: Optional[str] = None, country: Optional[str] = None, asn: Optional[int] = None,
+                 strategy: str = "weighted", lease_seconds: Optional[float] = None) -> Optional[Dict]:
+        """
+        租用一个代理
+        :param type_tag: 代理类型（normal/anonymous，为空时不限）
+        :param country: 国家代码（为空时不限）
+        :param asn: ASN（为空时不限）
+        :param strategy: weighted（按 评分×健康度 加权随机）/ lru（最久未被租用的优先，相同时评分高的优先）
+        :param lease_seconds: 租约时长（秒），为空时使用默认值
+        :return: 代理信息与租约（lease_id/expires_at），无可用代理时返回 None
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"strategy 仅支持 {'/'.join(STRATEGIES)}")
+        country = country.upper() if country else None
+        with self._lock:
+            now = time.time()
+            self._reap(now)
+            candidates = []
+            for proxy, entry in self._entries.items():
+                if ((type_tag and entry.get("type") != type_tag) or (country and entry.get("country") != country)
+                        or (asn and entry.get("asn") != asn)):
+                    continue
+                state = self._states.get(proxy)
+                if state and (state["active"] >= self.max_leases_per_proxy or state["benched_until"] > now):
+                    continue
+                candidates.append((proxy, entry, state))
+            if not candidates:
+                metrics.LEASES.inc(result="unavailable")
+                return None
+
+            if strategy == "lru":
+                proxy, entry, _ = min(candidates, key=lambda item: (item[2]["last_used"] if item[2] else 0.0,
+                                                                   -(item[1].get("score") or 0)))
+            else:
+                weights = [max(entry.get("score") or 0, 1.0) * self._health(state) for _, entry, state in candidates]
+                proxy, entry, _ = random.choices(candidates, weights)[0]
+
+            state = self._state(proxy)
+            state["active"] += 1
+            state["last_used"] = now
+            duration = min(lease_seconds or self.lease_seconds, self.max_lease_seconds)
+            lease_id = uuid.uuid4().hex
+            self._leases[lease_id] = {"proxy": proxy, "expires_at": now + duration}
+            metrics.LEASES.inc(result="granted")
+            metrics.LEASES_ACTIVE.set(len(self._leases))
+            return dict(entry, lease_id=lease_id, expires_at=round(now + duration, 3),
+                        health=round(self._health(state), 3))
+
+    def release(self, lease_id: str, success: Optional[bool] = None) -> Optional[Dict]:
+        """
+        归还租约并上报使用结果
+        :param lease_id: checkout 返回的租约ID
+        :param success: 使用是否成功（为空时只归还，不计入健康度）
+        :return: 代理的健康状态（proxy/health/benched），租约不存在或已过期时返回 None
+        """
+        with self._lock:
+            lease = self._leases.pop(lease_id, None)
+            if lease is None:
+                return None
+            proxy = lease["proxy"]
+            state = self._state(proxy)
+            state["active"] -= 1
+            metrics.LEASES.inc(result="released")
+            metrics.LEASES_ACTIVE.set(len(self._leases))
+            if success is not None:
+                self._record(proxy, state, success)
+            return {"proxy": proxy, "health": round(self._health(state), 3),
+                    "benched": state["benched_until"] > time.time()}
+
+    def report(self, proxy: str, success: bool) -> bool:
+        """不经租约直接上报代理的使用结果（如从 /random 获取的代理），返回代理是否在池中"""
+        with self._lock:
+            if proxy not in self._entries:
+                return False
+            self._record(proxy, self._state(proxy), success)
+            return True
+
+    def _record(self, proxy: str, state: Dict, success: bool) -> None:
+        """内部方法：记录一次反馈，窗口内成功率过低时暂停分配"""
+        now = time.time()
+        if state["benched_until"] and state["benched_until"] <= now:
+            state["results"].clear()  # 暂停到期：重新计算
+            state["benched_until"] = 0.0
+        state["results"].append(success)
+        metrics.LEASE_FEEDBACK.inc(result="success" if success else "failure")
+        results = state["results"]
+        if len(results) >= self.min_samples and sum(results) / len(results) < self.min_health:
+            state["benched_until"] = now + self.bench_seconds
+            print(f"⛔ [代理租用] {proxy} 最近 {len(results)} 次使用成功率 {sum(results) / len(results) * 100:.0f}%，"
+                  f"暂停分配 {self.bench_seconds / 60:.0f} 分钟")
+
+    def stats(self) -> Dict[str, int]:
+        """当前可分配代理数、租出数、暂停数"""
+        with self._lock:
+            now = time.time()
+            self._reap(now)
+            benched = sum(1 for proxy, state in self._states.items()
+                          if proxy in self._entries and state["benched_until"] > now)
+            return {"pool": len(self._entries), "leased": len(self._leases), "benched": benched}
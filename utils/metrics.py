@@ -0,0 +1,197 @@
+import math
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+from utils.storage import ProxyStorage
+
+# 延迟类直方图的默认分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricsRegistry:
+    """指标注册表：汇总所有指标，输出 Prometheus 文本格式"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: "_Metric") -> None:
+        """注册指标（由指标构造时自动调用）"""
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式（text/plain; version=0.0.4）"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, filename: str) -> None:
+        """原子写入文件（可供 node_exporter textfile collector 采集）"""
+        ProxyStorage.write_text_atomic(filename, self.render())
+
+
+REGISTRY = MetricsRegistry()  # 默认注册表
+
+
+def _format_value(value: float) -> str:
+    """内部方法：按 Prometheus 规则格式化数值"""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """内部方法：格式化标签（转义反斜杠、引号与换行）"""
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    """内部类：带标签的指标基类（线程安全）"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: MetricsRegistry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # 标签值元组 -> 数值
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """内部方法：按声明顺序取标签值"""
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def get(self, **labels) -> float:
+        """读取当前值（未记录过时为0）"""
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        """输出样本行"""
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Counter(_Metric):
+    """计数器：只增不减"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """仪表：可任意设置的当前值"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def clear(self) -> None:
+        """清空所有标签组合（如每轮重算的按源指标）"""
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    """直方图：按分桶累计观测值的分布"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, registry: MetricsRegistry = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def get(self, **labels) -> float:
+        """读取观测次数"""
+        state = self._values.get(self._key(labels))
+        return state["count"] if state else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, dict(state, buckets=list(state["buckets"]))) for key, state in self._values.items())
+        lines = []
+        labelnames = self.labelnames + ("le",)
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["buckets"]):
+                cumulative += count
+                labels = _format_labels(labelnames, key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+# 按代理源
+SOURCE_FETCH_SECONDS = Histogram("proxy_source_fetch_seconds", "代理源单页请求耗时（秒）", ["source"])
+SOURCE_BYTES = Counter("proxy_source_bytes_total", "代理源累计下载字节数", ["source"])
+SOURCE_PAGES = Counter("proxy_source_pages_total", "代理源请求页数（result=ok/failed/cached）", ["source", "result"])
+SOURCE_PARSE_SECONDS = Histogram("proxy_source_parse_seconds", "代理源单页解析耗时（秒）", ["source"],
+                                 buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+SOURCE_CANDIDATES = Counter("proxy_source_candidates_total", "代理源解析出的候选代理数", ["source"])
+SOURCE_VALID_FORMAT = Counter("proxy_source_valid_format_total", "代理源格式校验通过的候选代理数", ["source"])
+SOURCE_ROUND_CHECKED = Gauge("proxy_source_round_checked", "上一轮由该源首次发现并送验的代理数", ["source"])
+SOURCE_ROUND_VALID = Gauge("proxy_source_round_valid", "上一轮由该源首次发现且验证通过的代理数", ["source"])
+SOURCE_ROUND_YIELD = Gauge("proxy_source_round_yield_ratio", "上一轮该源送验代理的有效率", ["source"])
+SOURCE_CIRCUIT_OPEN = Gauge("proxy_source_circuit_open", "代理源是否处于熔断状态（1=熔断）", ["source"])
+
+# 验证器
+CHECKS_IN_FLIGHT = Gauge("proxy_checks_in_flight", "正在进行的HTTP验证数")
+CHECKS = Counter("proxy_checks_total", "HTTP验证次数（result=valid/invalid/cancelled）", ["result"])
+CHECK_SECONDS = Histogram("proxy_check_seconds", "HTTP验证耗时（秒）", ["result"])
+CHECK_TTFB_SECONDS = Histogram("proxy_check_ttfb_seconds", "有效代理的首字节耗时（秒）")
+CHECK_TIMEOUT_SECONDS = Gauge("proxy_check_timeout_seconds", "当前HTTP验证超时（按成功验证耗时分位数自适应，秒）")
+PREFILTER_PROBES = Counter("proxy_prefilter_probes_total", "TCP预筛探测次数（result=reachable/unreachable）",
+                           ["result"])
+ROUND_CHECKS_PER_SECOND = Gauge("proxy_round_checks_per_second", "上一轮HTTP验证吞吐（次/秒）")
+
+# 按轮次
+ROUND_STAGE_SECONDS = Gauge("proxy_round_stage_seconds", "上一轮各阶段耗时（秒，stage=crawl/dedup/validate/save）",
+                            ["stage"])
+ROUNDS = Counter("proxy_rounds_total", "已完成的轮次数")
+ROUND_TIMESTAMP = Gauge("proxy_round_last_timestamp_seconds", "上一轮完成时间（Unix时间戳）")
+POOL_SIZE = Gauge("proxy_pool_size", "当前有效代理数", ["type"])
+
+# 代理租用
+LEASES = Counter("proxy_leases_total", "代理租约次数（result=granted/released/expired/unavailable）", ["result"])
+LEASES_ACTIVE = Gauge("proxy_leases_active", "当前未归还的代理租约数")
+LEASE_FEEDBACK = Counter("proxy_lease_feedback_total", "使用方上报的代理使用结果（result=success/failure）", ["result"])
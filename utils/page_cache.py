@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from utils.storage import ProxyStorage
+
+
+class PageCache:
+    """代理源页面缓存：按URL记录 ETag/Last-Modified、响应体哈希与上次解析出的候选代理，页面未变化时跳过下载与解析"""
+
+    def __init__(self, filename: str = "page_cache.json", expire_seconds: int = 24 * 3600):
+        """
+        :param filename: 缓存文件
+        :param expire_seconds: 超过该时长未再请求的页面从缓存中清除
+        """
+        self.filename = filename
+        self.expire_seconds = expire_seconds
+        self.entries = {}  # 缓存键 -> 缓存条目
+        self.hit_count = 0  # 本轮复用上次结果的页数
+        self.load()
+
+    def load(self) -> None:
+        """从文件加载缓存（文件不存在或损坏时从空缓存开始）"""
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", {})
+        except (OSError, ValueError) as e:
+            print(f"⚠️ [页面缓存] 加载失败，重新缓存：{str(e)[:50]}")
+            self.entries = {}
+
+    def save(self) -> None:
+        """清理过期条目并保存到文件"""
+        now = time.time()
+        self.entries = {key: entry for key, entry in self.entries.items()
+                        if now - entry["last_fetched"] < self.expire_seconds}
+        ProxyStorage.write_json_atomic(self.filename, {"update_time": now, "entries": self.entries}, indent=None)
+
+    @staticmethod
+    def make_key(url: str, post_data: Optional[Dict] = None) -> str:
+        """缓存键：URL + 排序后的POST数据（POST分页接口的URL相同，页码在请求体中）"""
+        if not post_data:
+            return url
+        return url + " " + json.dumps(post_data, sort_keys=True, ensure_ascii=False)
+
+    @staticmethod
+    def body_hash(content: bytes) -> str:
+        """响应体哈希（服务器不支持条件请求时据此判断内容是否变化）"""
+        return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+    def get(self, key: str, parser: str) -> Optional[Dict]:
+        """获取缓存条目（解析器不同时视为无缓存）"""
+        entry = self.entries.get(key)
+        return entry if entry and entry["parser"] == parser else None
+
+    def conditional_headers(self, key: str, parser: str) -> Dict[str, str]:
+        """构造条件请求头（If-None-Match / If-Modified-Since）"""
+        entry = self.get(key, parser)
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def touch(self, key: str) -> None:
+        """页面未变化：刷新请求时间并计入命中"""
+        self.entries[key]["last_fetched"] = time.time()
+        self.hit_count += 1
+
+    def put(self, key: str, parser: str, etag: Optional[str], last_modified: Optional[str], body_hash: str,
+            candidates: List[int], page_count: Optional[int] = None) -> None:
+        """
+        保存页面的解析结果
+        :param candidates: 本页校验通过的候选代理（打包整数）
+        :param page_count: 第1页嗅探/读取到的总页数（auto 分页的源复用）
+        """
+        self.entries[key] = {
+            "parser": parser,
+            "etag": etag,
+            "last_modified": last_modified,
+            "hash": body_hash,
+            "candidates": candidates,
+            "page_count": page_count,
+            "last_fetched": time.time()
+        }
@@ -0,0 +1,122 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from typing import Callable, List, Optional
+
+from utils import metrics
+
+try:
+    import resource  # 仅类Unix系统可用，用于读取文件描述符上限
+except ImportError:
+    resource = None
+
+
+class TcpPrefilter:
+    """TCP连接预筛：在后台事件循环中并发发起非阻塞 TCP 连接，只放行可连通的 IP:PORT"""
+
+    def __init__(self, timeout: float = 2.0, concurrency: int = 1000):
+        """
+        :param timeout: 单个 TCP 连接的超时时间（秒）
+        :param concurrency: 同时进行中的最大连接数
+        """
+        self.timeout = timeout
+        self.concurrency = self._limit_concurrency(concurrency)
+        self.probed_count = 0  # 已探测数
+        self.reachable_count = 0  # 可连通数
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._futures = {}  # 探测任务 -> 代理
+        self._on_reachable = None
+
+    @staticmethod
+    def _limit_concurrency(concurrency: int) -> int:
+        """内部方法：并发数不超过进程文件描述符上限（预留部分给验证线程与日志）"""
+        if resource is None:
+            return concurrency
+        soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft_limit == resource.RLIM_INFINITY:
+            return concurrency
+        return max(1, min(concurrency, soft_limit // 2))
+
+    async def _create_semaphore(self) -> None:
+        """内部方法：在后台事件循环内创建信号量（需绑定到该循环）"""
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def _probe(self, proxy: str) -> None:
+        """内部方法：探测单个代理端口是否可连通，可连通时回调 on_reachable(proxy, 连接耗时)"""
+        ip, _, port = proxy.partition(':')
+        async with self._semaphore:
+            start_time = time.perf_counter()
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(ip, int(port)), self.timeout)
+            except Exception:
+                metrics.PREFILTER_PROBES.inc(result="unreachable")
+                return
+            finally:
+                self.probed_count += 1
+            connect_time = time.perf_counter() - start_time
+            writer.close()
+        self.reachable_count += 1
+        metrics.PREFILTER_PROBES.inc(result="reachable")
+        self._on_reachable(proxy, connect_time)
+
+    def start(self, on_reachable: Callable[[str, float], None]) -> None:
+        """
+        启动后台事件循环线程
+        :param on_reachable: 可连通代理的回调（在后台线程中调用，需线程安全）
+        """
+        self.probed_count = 0
+        self.reachable_count = 0
+        self._futures = {}
+        self._on_reachable = on_reachable
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._create_semaphore(), self._loop).result()
+
+    def submit(self, proxy: str) -> None:
+        """提交单个代理进行 TCP 探测（线程安全，立即返回）"""
+        self._futures[asyncio.run_coroutine_threadsafe(self._probe(proxy), self._loop)] = proxy
+
+    @staticmethod
+    async def _cancel_pending() -> None:
+        """内部方法：取消后台事件循环中未完成的探测并等待其退出"""
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def finish(self, timeout: Optional[float] = None) -> List[str]:
+        """
+        等待所有探测结束并停止后台事件循环
+        :param timeout: 最长等待时间（秒），超时后取消未完成的探测；为空时一直等待
+        :return: 被取消的代理列表
+        """
+        _, pending = concurrent.futures.wait(self._futures, timeout)
+        cancelled = []
+        if pending:
+            asyncio.run_coroutine_threadsafe(self._cancel_pending(), self._loop).result()
+            cancelled = [self._futures[future] for future in pending if future.cancelled()]
+        self._futures = {}
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        return cancelled
+
+    def filter(self, proxies: List[str], on_reachable: Optional[Callable[[str, float], None]] = None) -> List[str]:
+        """批量探测，返回可连通的代理列表"""
+        reachable = []
+
+        def collect(proxy: str, connect_time: float) -> None:
+            reachable.append(proxy)
+            if on_reachable:
+                on_reachable(proxy, connect_time)
+
+        self.start(collect)
+        for proxy in proxies:
+            self.submit(proxy)
+        self.finish()
+        return reachable
@@ -0,0 +1,64 @@
+import time
+from typing import List, Optional, Tuple
+
+MIN_INTERVAL = 60  # 自适应间隔的绝对下限（秒）
+
+
+class SourceScheduler:
+    """代理源刷新调度：每个源按自己的 interval 到期刷新，adaptive 源按上次新候选的比例自动伸缩间隔"""
+
+    def __init__(self, default_interval: float, grow_factor: float = 2.0, shrink_factor: float = 0.5,
+                 churn_ratio: float = 0.5):
+        """
+        :param default_interval: 未配置 interval 的源的刷新间隔（秒）
+        :param grow_factor: 自适应源上次没有新候选时，间隔乘以该系数（放慢）
+        :param shrink_factor: 自适应源上次新候选比例不低于 churn_ratio 时，间隔乘以该系数（加快）
+        :param churn_ratio: 判定为高频更新源的新候选比例
+        """
+        self.default_interval = default_interval
+        self.grow_factor = grow_factor
+        self.shrink_factor = shrink_factor
+        self.churn_ratio = churn_ratio
+        self._entries = {}  # id(源配置) -> 调度状态（允许同名的源）
+
+    def add(self, source: dict, type_tag: str) -> None:
+        """登记代理源（立即到期，启动后首轮即爬取）"""
+        interval = source.get("interval", self.default_interval)
+        self._entries[id(source)] = {
+            "source": source,
+            "type": type_tag,
+            "interval": interval,
+            "min_interval": source.get("min_interval", max(MIN_INTERVAL, interval / 4)),
+            "max_interval": source.get("max_interval", interval * 4),
+            "next_time": 0.0
+        }
+
+    def due(self, now: Optional[float] = None) -> List[Tuple[dict, str]]:
+        """到期需要刷新的代理源列表：(源配置, 类型)"""
+        now = time.time() if now is None else now
+        return [(entry["source"], entry["type"]) for entry in self._entries.values() if entry["next_time"] <= now]
+
+    def record(self, source: dict, seen_count: int, new_count: int, now: Optional[float] = None) -> float:
+        """
+        记录一次刷新结果并安排下次刷新时间
+        :param source: 源配置（add 时登记的同一对象）
+        :param seen_count: 本次抓到的候选代理数
+        :param new_count: 其中历史记录中从未出现过的代理数
+        :return: 下次刷新间隔（秒）
+        """
+        entry = self._entries[id(source)]
+        if entry["source"].get("adaptive"):
+            if new_count == 0:
+                entry["interval"] = min(entry["interval"] * self.grow_factor, entry["max_interval"])
+            elif new_count >= seen_count * self.churn_ratio:
+                entry["interval"] = max(entry["interval"] * self.shrink_factor, entry["min_interval"])
+        entry["next_time"] = (time.time() if now is None else now) + entry["interval"]
+        return entry["interval"]
+
+    def postpone(self, source: dict, delay: float, now: Optional[float] = None) -> None:
+        """推迟下次刷新（本次未实际爬取，如熔断中跳过），不改变自适应间隔"""
+        self._entries[id(source)]["next_time"] = (time.time() if now is None else now) + delay
+
+    def next_time(self) -> float:
+        """最近一个源的到期时间（无源时为无穷大）"""
+        return min((entry["next_time"] for entry in self._entries.values()), default=float("inf"))
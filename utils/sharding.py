@@ -0,0 +1,250 @@
+"""
+分片验证：去重后的候选代理按哈希拆成 N 个分片，写入共享目录，由本机多个工作进程或多台机器上的工作节点领取验证，
+结果文件汇总回一个代理池。
+
+工作节点（多机时各节点挂载同一共享目录）：python -m utils.sharding --dir shards [--threads 200]
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import time
+import zlib
+from multiprocessing.process import BaseProcess
+from typing import Dict, List, Optional, Tuple
+
+from utils import metrics
+from utils.storage import ProxyStorage
+from utils.validator import ProxyValidator
+
+
+def shard_of(proxy: str, shard_count: int) -> int:
+    """代理所属分片（crc32 稳定哈希，各节点、各次运行结果一致）"""
+    return zlib.crc32(proxy.encode("utf-8")) % shard_count
+
+
+def split_shards(proxies: List[str], shard_count: int) -> List[List[str]]:
+    """按哈希把代理拆成 shard_count 个分片"""
+    shards = [[] for _ in range(shard_count)]
+    for proxy in proxies:
+        shards[shard_of(proxy, shard_count)].append(proxy)
+    return shards
+
+
+def _round_started_at(round_dir: str) -> int:
+    """内部方法：从任务目录名 round-<毫秒时间戳>-<pid> 中取出发布时间（无法解析时为0）"""
+    parts = os.path.basename(round_dir).split("-")
+    return int(parts[1]) if len(parts) == 3 and parts[0] == "round" and parts[1].isdigit() else 0
+
+
+def _claim_task(work_dir: str, worker_id: str) -> Optional[str]:
+    """
+    内部方法：领取一个待验证分片（rename 是原子操作，多个进程/节点竞争时只有一个成功），返回领取后的文件路径
+    优先领取最新一轮的分片，协调方异常退出遗留的旧轮次不会挡在当前轮次之前
+    """
+    task_paths = glob.glob(os.path.join(work_dir, "*", "task-*.json"))
+    task_paths.sort(key=lambda path: (-_round_started_at(os.path.dirname(path)), path))
+    for task_path in task_paths:
+        claimed_path = f"{task_path}.{worker_id}"
+        try:
+            os.rename(task_path, claimed_path)
+        except OSError:
+            continue  # 已被其他工作进程领取
+        os.utime(claimed_path)  # 租约从领取时刻开始计算
+        return claimed_path
+    return None
+
+
+def run_worker(work_dir: str, thread_count: int = 200, idle_exit: bool = True, poll_interval: float = 1.0) -> int:
+    """
+    工作进程主循环：领取分片 -> 验证 -> 写结果文件
+    :param work_dir: 共享任务目录
+    :param thread_count: 每个分片的验证线程数
+    :param idle_exit: 没有待领取分片时退出（本机工作进程），否则持续轮询（常驻工作节点）
+    :param poll_interval: 轮询间隔（秒）
+    :return: 本进程验证的分片数
+    """
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    done_count = 0
+    while True:
+        claimed_path = _claim_task(work_dir, worker_id)
+        if claimed_path is None:
+            if idle_exit:
+                return done_count
+            time.sleep(poll_interval)
+            continue
+        try:
+            with open(claimed_path, "r", encoding="utf-8") as f:
+                task = json.load(f)
+        except (OSError, ValueError):
+            continue  # 分片被协调方回收或清理
+        validator = ProxyValidator(timeout=task["timeout"])
+        validator.real_ip = task.get("real_ip")  # 协调方开启匿名度检测时一并判断
+        proxies = task["proxies"]
+        budget = max(0.0, task["deadline"] - time.time()) if task.get("deadline") else None
+        valid_proxies = validator.validate(proxies, task["test_url"], task["keyword"],
+                                           thread_count, budget, task.get("unseeded")) if proxies else []
+        result_path = os.path.join(os.path.dirname(claimed_path), f"result-{task['shard']:04d}.json")
+        try:
+            ProxyStorage.write_json_atomic(result_path, {
+                "shard": task["shard"],
+                "worker": worker_id,
+                "checked": len(proxies),
+                "valid": valid_proxies,
+                "cancelled": validator.cancelled_proxies,
+                "results": validator.results
+            }, indent=None)
+            os.unlink(claimed_path)
+        except OSError:
+            pass  # 本轮已被协调方清理（超时后由其他进程完成）
+        done_count += 1
+
+
+class ShardCoordinator:
+    """分片验证协调方：发布分片任务、按需启动本机工作进程、回收超时分片并汇总结果"""
+
+    def __init__(self, work_dir: str = "shards", shard_count: int = 4, local_workers: int = 4,
+                 lease_seconds: float = 600, collect_timeout: Optional[float] = None):
+        """
+        :param work_dir: 共享任务目录（多机时为各节点都能访问的共享目录）
+        :param shard_count: 分片数
+        :param local_workers: 本机启动的工作进程数（为0时完全依赖其他节点上的工作进程）
+        :param lease_seconds: 分片被领取后超过该时长仍无结果，视为工作进程失联并重新放回待领取
+        :param collect_timeout: 等待结果的最长时间（秒），超时后剩余未领取的分片由本进程直接验证；为空时一直等待
+        """
+        self.work_dir = work_dir
+        self.shard_count = shard_count
+        self.local_workers = local_workers
+        self.lease_seconds = lease_seconds
+        self.collect_timeout = collect_timeout
+        self.cancelled_proxies = []  # 上一轮因时间预算用尽而未完成验证的代理
+        os.makedirs(work_dir, exist_ok=True)
+        self._clean_stale_rounds()
+
+    def _clean_stale_rounds(self) -> None:
+        """内部方法：清理协调方上次异常退出时遗留的任务目录（每个任务目录只属于一个协调方，启动时不会有进行中的轮次）"""
+        stale_dirs = glob.glob(os.path.join(self.work_dir, "round-*"))
+        for round_dir in stale_dirs:
+            shutil.rmtree(round_dir, ignore_errors=True)
+        if stale_dirs:
+            print(f"🧹 [分片验证] 已清理 {len(stale_dirs)} 个遗留任务目录")
+
+    def publish(self, proxies: List[str], test_url: str, keyword: str, timeout: float = 10,
+                real_ip: Optional[str] = None, deadline: Optional[float] = None,
+                unseeded: Optional[List[str]] = None) -> str:
+        """发布分片任务（deadline 为各节点共用的截止时间戳，unseeded 为不计入自适应超时样本的代理），返回本轮任务目录"""
+        unseeded = set(unseeded or ())
+        round_dir = os.path.join(self.work_dir, f"round-{int(time.time() * 1000)}-{os.getpid()}")
+        os.makedirs(round_dir)
+        for shard, shard_proxies in enumerate(split_shards(proxies, self.shard_count)):
+            ProxyStorage.write_json_atomic(os.path.join(round_dir, f"task-{shard:04d}.json"), {
+                "shard": shard,
+                "test_url": test_url,
+                "keyword": keyword,
+                "timeout": timeout,
+                "real_ip": real_ip,
+                "deadline": deadline,
+                "proxies": shard_proxies,
+                "unseeded": [proxy for proxy in shard_proxies if proxy in unseeded]
+            }, indent=None)
+        return round_dir
+
+    def _requeue_stale(self, round_dir: str) -> None:
+        """内部方法：把超时未完成的已领取分片放回待领取"""
+        now = time.time()
+        for claimed_path in glob.glob(os.path.join(round_dir, "task-*.json.*")):
+            try:
+                if now - os.path.getmtime(claimed_path) > self.lease_seconds:
+                    task_path = claimed_path[:claimed_path.index(".json.") + len(".json")]
+                    os.rename(claimed_path, task_path)
+                    print(f"⚠️ [分片验证] 分片超时未完成，重新放回待领取：{os.path.basename(task_path)}")
+            except OSError:
+                continue  # 刚好完成或已被回收
+
+    def collect(self, round_dir: str, processes: List[BaseProcess], thread_count: int,
+                deadline: Optional[float] = None) -> Tuple[List[str], Dict[str, Dict], int]:
+        """等待全部分片结果并合并（取消的代理记入 cancelled_proxies），返回 (有效代理, 耗时指标, 已验证数)"""
+        start_time = time.time()
+        results_paths = [os.path.join(round_dir, f"result-{shard:04d}.json") for shard in range(self.shard_count)]
+        while not all(os.path.exists(path) for path in results_paths):
+            self._requeue_stale(round_dir)
+            workers_gone = processes and not any(process.is_alive() for process in processes)
+            timed_out = ((self.collect_timeout is not None and time.time() - start_time > self.collect_timeout)
+                         or (deadline is not None and time.time() >= deadline))
+            if workers_gone or timed_out:
+                # 本机工作进程已退出、等待超时或已过截止时间：剩余未领取的分片由本进程直接处理（过截止时间的直接记为取消）
+                run_worker(self.work_dir, thread_count, idle_exit=True)
+            time.sleep(0.5)
+
+        valid_proxies, results, checked_count = [], {}, 0
+        self.cancelled_proxies = []
+        for path in results_paths:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            valid_proxies.extend(data["valid"])
+            results.update(data["results"])
+            self.cancelled_proxies.extend(data.get("cancelled", []))
+            checked_count += data["checked"] - len(data.get("cancelled", []))
+        return valid_proxies, results, checked_count
+
+    def validate(self, proxies: List[str], test_url: str, keyword: str, thread_count: int = 200,
+                 timeout: float = 10, real_ip: Optional[str] = None,
+                 deadline: Optional[float] = None,
+                 unseeded: Optional[List[str]] = None) -> Tuple[List[str], Dict[str, Dict]]:
+        """
+        分片验证一组代理
+        :param thread_count: 每个分片的验证线程数
+        :param real_ip: 本机出口IP（开启匿名度检测时，test_url 需为回显接口）
+        :param deadline: 截止时间戳（与流式验证一致，由调用方按本轮开始时间 + 时间预算计算），之后各节点取消未完成的验证
+        :param unseeded: 耗时不计入自适应超时样本的代理（如复检的已知有效代理）
+        :return: (有效代理列表, 有效代理 -> 耗时指标)
+        """
+        self.cancelled_proxies = []
+        if not proxies:
+            return [], {}
+        if not self.local_workers and self.collect_timeout is None and deadline is None:
+            # 没有本机工作进程时，若其他节点不在线会一直等待
+            raise ValueError("本机工作进程数为0时须设置 collect_timeout 或 deadline")
+        start_time = time.time()
+        round_dir = self.publish(proxies, test_url, keyword, timeout, real_ip, deadline, unseeded)
+        # spawn 启动：调用方进程已有多个线程（API服务、爬虫线程池等），fork 出的子进程可能继承被占用的锁而死锁
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=run_worker, args=(self.work_dir, thread_count), daemon=True)
+                     for _ in range(min(self.local_workers, self.shard_count))]
+        for process in processes:
+            process.start()
+        print(f"🔀 [分片验证] {len(proxies)} 个代理拆分为 {self.shard_count} 个分片 | 本机工作进程 {len(processes)} 个"
+              f" | 任务目录：{round_dir}")
+        try:
+            valid_proxies, results, checked_count = self.collect(round_dir, processes, thread_count, deadline)
+        finally:
+            for process in processes:
+                process.join(timeout=1)
+            shutil.rmtree(round_dir, ignore_errors=True)
+
+        # 工作进程中的验证次数不在本进程指标内，按汇总结果补记
+        metrics.CHECKS.inc(len(valid_proxies), result="valid")
+        metrics.CHECKS.inc(checked_count - len(valid_proxies), result="invalid")
+        metrics.CHECKS.inc(len(self.cancelled_proxies), result="cancelled")
+        print(f"✅ [分片验证] 完成 | 有效：{len(valid_proxies)} 个 / {checked_count} 个 | "
+              f"耗时 {time.time() - start_time:.1f} 秒" +
+              (f" | 结果未知（时间预算用尽/自适应超时截断）：{len(self.cancelled_proxies)} 个" if self.cancelled_proxies else ""))
+        return valid_proxies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FreeProxyPool 分片验证工作节点")
+    parser.add_argument("--dir", default="shards", help="共享任务目录（与协调方一致）")
+    parser.add_argument("--threads", type=int, default=200, help="每个分片的验证线程数")
+    parser.add_argument("--poll", type=float, default=1.0, help="无任务时的轮询间隔（秒）")
+    args = parser.parse_args()
+
+    print(f"🔀 [分片验证] 工作节点已启动，监听任务目录：{args.dir}")
+    run_worker(args.dir, args.threads, idle_exit=False, poll_interval=args.poll)
+
+
+if __name__ == "__main__":
+    main()
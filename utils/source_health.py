@@ -0,0 +1,145 @@
+import json
+import os
+import time
+from typing import Dict, Optional
+
+from utils import metrics
+from utils.storage import ProxyStorage
+
+EWMA_ALPHA = 0.3  # 失败率/延迟/有效率的指数滑动平均系数
+
+
+class SourceHealth:
+    """
+    代理源健康度与熔断：持久化每个源的请求失败率、延迟与有效率
+    连续多轮不健康（无候选代理、请求失败率过高、请求过慢或有效率过低）的源熔断一段时间（指数退避），
+    到期后只请求1页探测，成功才恢复完整爬取
+    """
+
+    def __init__(self, filename: str = "source_health.json", failure_threshold: int = 2,
+                 base_backoff: int = 1800, max_backoff: int = 24 * 3600, max_failure_rate: float = 0.8,
+                 max_latency_ms: Optional[float] = None, min_yield: float = 0.005):
+        """
+        :param filename: 健康记录文件
+        :param failure_threshold: 连续不健康多少轮后熔断
+        :param base_backoff: 首次熔断时长（秒），之后每次探测失败翻倍
+        :param max_backoff: 熔断时长上限（秒）
+        :param max_failure_rate: 页面请求失败率（滑动平均）超过该值视为不健康
+        :param max_latency_ms: 页面请求耗时（滑动平均）超过该值视为不健康，为空时不按耗时判断
+        :param min_yield: 送验代理有效率（滑动平均）低于该值视为不健康
+        """
+        self.filename = filename
+        self.failure_threshold = failure_threshold
+        self.max_failure_rate = max_failure_rate
+        self.max_latency_ms = max_latency_ms
+        self.min_yield = min_yield
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.records = {}  # 源键 -> 健康记录
+        self.load()
+
+    def load(self) -> None:
+        """从文件加载健康记录（文件不存在或损坏时从空记录开始）"""
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                self.records = json.load(f).get("records", {})
+        except (OSError, ValueError) as e:
+            print(f"⚠️ [源健康] 加载失败，重新记录：{str(e)[:50]}")
+            self.records = {}
+
+    def save(self) -> None:
+        """保存到文件"""
+        ProxyStorage.write_json_atomic(self.filename, {"update_time": time.time(), "records": self.records})
+
+    @staticmethod
+    def _key(source: dict) -> str:
+        """内部方法：源键（名称 + URL + POST数据，同名或同URL的源分别记录）"""
+        return f"{source['name']}|{source['url']}|{json.dumps(source.get('body'), sort_keys=True)}"
+
+    def _get_record(self, source: dict) -> Dict:
+        """内部方法：获取（不存在则创建）源的健康记录"""
+        key = self._key(source)
+        record = self.records.get(key)
+        if record is None:
+            record = self.records[key] = {
+                "name": source["name"],
+                "state": "closed",  # closed=正常 / open=熔断 / half_open=探测中
+                "failure_rate": 0.0,  # 页面请求失败率（滑动平均）
+                "latency_ms": None,  # 页面请求耗时（滑动平均）
+                "yield": None,  # 送验代理的有效率（滑动平均）
+                "last_candidates": 0,
+                "failed_rounds": 0,  # 连续不健康的轮数
+                "open_count": 0,  # 连续熔断次数（决定退避时长）
+                "open_until": 0
+            }
+        return record
+
+    @staticmethod
+    def _ewma(old: Optional[float], value: float) -> float:
+        """内部方法：指数滑动平均"""
+        return value if old is None else round(old + EWMA_ALPHA * (value - old), 4)
+
+    def allow(self, source: dict, now: Optional[float] = None) -> Optional[str]:
+        """
+        判断本轮是否爬取该源
+        :return: "closed"（完整爬取）/ "half_open"（熔断到期，只请求1页探测）/ None（熔断中，跳过）
+        """
+        record = self._get_record(source)
+        if record["state"] == "closed":
+            return "closed"
+        if (now or time.time()) < record["open_until"]:
+            return None
+        record["state"] = "half_open"
+        return "half_open"
+
+    def remaining(self, source: dict) -> float:
+        """熔断剩余时长（秒）"""
+        return max(0.0, self._get_record(source)["open_until"] - time.time())
+
+    def record_page(self, source: dict, ok: bool, elapsed: float) -> None:
+        """记录一次页面请求（是否成功、耗时秒数）"""
+        record = self._get_record(source)
+        record["failure_rate"] = self._ewma(record["failure_rate"], 0.0 if ok else 1.0)
+        if ok:
+            record["latency_ms"] = self._ewma(record["latency_ms"], elapsed * 1000)
+
+    def _unhealthy_reason(self, record: Dict, candidate_count: int) -> Optional[str]:
+        """内部方法：本轮不健康的原因（健康时为 None）"""
+        if candidate_count == 0:
+            return "无有效IP"
+        if record["failure_rate"] > self.max_failure_rate:
+            return f"请求失败率 {record['failure_rate'] * 100:.0f}%"
+        if self.max_latency_ms and record["latency_ms"] is not None and record["latency_ms"] > self.max_latency_ms:
+            return f"请求耗时 {record['latency_ms']:.0f} ms"
+        # 有效率在验证后才更新：探测轮只按本次请求结果判断，恢复完整爬取后再按新的有效率判断
+        if record["state"] != "half_open" and record["yield"] is not None and record["yield"] < self.min_yield:
+            return f"有效率 {record['yield'] * 100:.1f}%"
+        return None
+
+    def record_crawl(self, source: dict, candidate_count: int) -> None:
+        """记录一轮爬取结果：连续不健康的轮数达到阈值（或探测失败）时熔断"""
+        record = self._get_record(source)
+        record["last_candidates"] = candidate_count
+        name = source["name"]
+        reason = self._unhealthy_reason(record, candidate_count)
+        if reason is None:
+            if record["state"] != "closed":
+                print(f"✅ [源健康] {name} 探测成功，恢复完整爬取")
+            record.update(state="closed", failed_rounds=0, open_count=0, open_until=0)
+        else:
+            record["failed_rounds"] += 1
+            if record["state"] == "half_open" or record["failed_rounds"] >= self.failure_threshold:
+                record["open_count"] += 1
+                backoff = min(self.base_backoff * 2 ** (record["open_count"] - 1), self.max_backoff)
+                record.update(state="open", open_until=time.time() + backoff)
+                print(f"⛔ [源健康] {name} 连续 {record['failed_rounds']} 轮不健康（{reason}），"
+                      f"熔断 {backoff / 60:.0f} 分钟")
+        metrics.SOURCE_CIRCUIT_OPEN.set(1 if record["state"] == "open" else 0, source=name)
+
+    def record_yield(self, source: dict, checked_count: int, valid_count: int) -> None:
+        """记录一轮验证后的有效率"""
+        if checked_count:
+            record = self._get_record(source)
+            record["yield"] = self._ewma(record["yield"], valid_count / checked_count)
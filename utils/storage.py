@@ -1,17 +1,86 @@
 import json
+import math
+import mmap
+import os
+import random
+import sqlite3
+import struct
+import tempfile
 import time
-from typing import List
+from typing import Dict, List, Optional, Tuple
+
+from utils.candidates import pack_proxy, unpack_proxy
+
+METRIC_FIELDS = ("connect_ms", "ttfb_ms", "total_ms", "score")
+GEO_FIELDS = ("country", "asn", "as_name")  # 离线归属查询写入的字段（见 utils.geoip）
+
+# 二进制快照：文件头 + 按 (类型, IP, 端口) 排序的定长记录（小端）
+SNAPSHOT_MAGIC = b"FPPB"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct("<4sHHIId")  # 魔数、版本、记录长度、普通代理数、高匿代理数、生成时间
+# IPv4、端口、类型（0=普通/1=高匿）、填充、国家代码（2字节ASCII，未知为空）、填充、ASN（未知为0）、总耗时ms、评分（缺失为NaN）
+SNAPSHOT_RECORD = struct.Struct("<IHBx2s2xIff")
+SNAPSHOT_KEY = struct.Struct("<IH")  # 记录开头的 IPv4 + 端口（二分查找时只解析这部分）
+SNAPSHOT_TYPES = ("normal", "anonymous")
+
+_UMASK = os.umask(0)  # 读取 umask 只能先设置再恢复（进程级，导入时做一次，避免运行中与其他线程新建文件冲突）
+os.umask(_UMASK)
 
 
 class ProxyStorage:
     @staticmethod
-    def save_proxies_with_type(filename: str, normal_proxies: List[str], anonymous_proxies: List[str]) -> None:
+    def write_text_atomic(filename: str, text: str) -> None:
+        """原子写入文本：先写同目录临时文件，再 rename 覆盖，读取方不会读到半截文件"""
+        ProxyStorage._write_atomic(filename, text, "w", "utf-8")
+
+    @staticmethod
+    def write_bytes_atomic(filename: str, data: bytes) -> None:
+        """原子写入二进制数据（见 write_text_atomic）"""
+        ProxyStorage._write_atomic(filename, data, "wb", None)
+
+    @staticmethod
+    def _file_mode(filename: str) -> int:
+        """内部方法：目标文件已存在时沿用其权限，否则按 umask 取普通新建文件的权限（通常为 0644）"""
+        try:
+            return os.stat(filename).st_mode & 0o7777
+        except FileNotFoundError:
+            return 0o666 & ~_UMASK
+
+    @staticmethod
+    def _write_atomic(filename: str, data, mode: str, encoding: Optional[str]) -> None:
+        """内部方法：写同目录临时文件并刷盘，再 rename 覆盖目标文件"""
+        directory = os.path.dirname(os.path.abspath(filename))
+        fd, temp_path = tempfile.mkstemp(prefix=".tmp_", dir=directory)
+        try:
+            with os.fdopen(fd, mode, encoding=encoding) as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp_path, ProxyStorage._file_mode(filename))  # mkstemp 创建的临时文件为 0600
+            os.replace(temp_path, filename)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @staticmethod
+    def write_json_atomic(filename: str, data, indent: Optional[int] = 2) -> None:
+        """原子写入JSON（见 write_text_atomic）"""
+        ProxyStorage.write_text_atomic(filename, json.dumps(data, ensure_ascii=False, indent=indent))
+
+    @staticmethod
+    def save_proxies_with_type(filename: str, normal_proxies: List[str], anonymous_proxies: List[str],
+                               metrics: Optional[Dict[str, Dict]] = None) -> None:
         """
         保存代理IP到JSON文件（区分普通/高匿类型）
         :param filename: 保存文件名
         :param normal_proxies: 有效普通代理列表
         :param anonymous_proxies: 有效高匿代理列表
+        :param metrics: 代理 -> 耗时与评分指标（connect_ms/ttfb_ms/total_ms/score），提供时列表按评分从高到低排序
         """
+        metrics = metrics or {}
+        if metrics:
+            normal_proxies = ProxyStorage.sort_by_score(normal_proxies, metrics)
+            anonymous_proxies = ProxyStorage.sort_by_score(anonymous_proxies, metrics)
         total_count = len(normal_proxies) + len(anonymous_proxies)
         save_data = {
             "summary": {
@@ -23,11 +92,11 @@ class ProxyStorage:
             "proxy_list": {
                 "normal": normal_proxies,  # 普通代理IP列表（透明/普通匿名）
                 "anonymous": anonymous_proxies  # 高匿代理IP列表（高匿名）
-            }
+            },
+            "metrics": {proxy: metrics[proxy] for proxy in normal_proxies + anonymous_proxies if proxy in metrics}
         }
 
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(save_data, f, ensure_ascii=False, indent=2)
+        ProxyStorage.write_json_atomic(filename, save_data)
 
         # 保存提示
         print(f"\n{'=' * 60}")
@@ -40,6 +109,37 @@ class ProxyStorage:
         print(f"⏰ 最后更新时间：{save_data['summary']['update_time']}")
         print(f"{'=' * 60}")
 
+    @staticmethod
+    def save_binary_snapshot(filename: str, normal_proxies: List[str], anonymous_proxies: List[str],
+                             metrics: Optional[Dict[str, Dict]] = None) -> None:
+        """
+        保存定长二进制快照（供多个进程 mmap 后直接二分查找/随机抽样，无需解析，见 BinarySnapshot）
+        :param filename: 保存文件名
+        :param normal_proxies: 有效普通代理列表
+        :param anonymous_proxies: 有效高匿代理列表
+        :param metrics: 代理 -> 耗时与评分指标（使用 total_ms/score 与归属 country/asn）
+        """
+        metrics = metrics or {}
+        counts, chunks = [], []
+        for type_code, proxies in enumerate((normal_proxies, anonymous_proxies)):
+            keys = sorted({key for key in map(pack_proxy, proxies) if key is not None})
+            counts.append(len(keys))
+            for key in keys:
+                entry = metrics.get(unpack_proxy(key), {})
+                total_ms, score = entry.get("total_ms"), entry.get("score")
+                country = (entry.get("country") or "").encode("ascii", "ignore")[:2]
+                chunks.append(SNAPSHOT_RECORD.pack(key >> 16, key & 0xFFFF, type_code, country, entry.get("asn") or 0,
+                                                   math.nan if total_ms is None else total_ms,
+                                                   math.nan if score is None else score))
+        header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, SNAPSHOT_RECORD.size,
+                                      counts[0], counts[1], time.time())
+        ProxyStorage.write_bytes_atomic(filename, header + b"".join(chunks))
+
+    @staticmethod
+    def sort_by_score(proxies: List[str], metrics: Dict[str, Dict]) -> List[str]:
+        """按评分从高到低排序（无指标的代理排在最后）"""
+        return sorted(proxies, key=lambda proxy: metrics.get(proxy, {}).get("score", -1), reverse=True)
+
     @staticmethod
     def save_to_json(filename: str, proxies: List[str]) -> None:
         """兼容方法：保存单一类型代理IP到JSON"""
@@ -49,8 +149,7 @@ class ProxyStorage:
             "proxies": proxies
         }
 
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(save_data, f, ensure_ascii=False, indent=2)
+        ProxyStorage.write_json_atomic(filename, save_data)
 
         print(f"\n{'=' * 50}")
         print(f"💾 代理IP保存完成！")
@@ -58,3 +157,360 @@ class ProxyStorage:
         print(f"📊 保存统计：共 {len(proxies):3d} 个代理IP")
         print(f"⏰ 最后更新时间：{save_data['update_time']}")
         print(f"{'=' * 50}")
+
+
+class BinarySnapshot:
+    """
+    只读打开二进制快照（mmap：多个进程共享同一份页缓存，不解析、不为每个代理构建字符串）
+    记录按 (类型, IP, 端口) 排序：同类型的记录连续存放，可按代理二分查找，也可在某一类型内O(1)随机抽样
+    """
+
+    def __init__(self, filename: str = "proxy_pool.bin"):
+        self.filename = filename
+        self._file = None
+        self._mm = None
+        self._stat = None
+        self.open()
+
+    def open(self) -> None:
+        """打开（或重新打开）快照文件并校验文件头"""
+        file = open(self.filename, "rb")
+        try:
+            stat = os.fstat(file.fileno())
+            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            file.close()
+            raise
+        magic, version, record_size, normal_count, anonymous_count, update_time = SNAPSHOT_HEADER.unpack_from(mm)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or record_size != SNAPSHOT_RECORD.size:
+            mm.close()
+            file.close()
+            raise ValueError(f"不支持的快照格式：{self.filename}")
+        self.close()
+        self._file, self._mm, self._stat = file, mm, stat
+        self.update_time = update_time
+        self._ranges = {"normal": (0, normal_count), "anonymous": (normal_count, normal_count + anonymous_count)}
+
+    def refresh(self) -> bool:
+        """快照文件被替换（新一轮保存）时重新打开，返回是否已重新打开"""
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return False
+        if (stat.st_ino, stat.st_mtime_ns) == (self._stat.st_ino, self._stat.st_mtime_ns):
+            return False
+        self.open()
+        return True
+
+    def close(self) -> None:
+        """关闭映射与文件"""
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+            self._mm = self._file = None
+
+    def __enter__(self) -> "BinarySnapshot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._ranges["anonymous"][1]
+
+    def count(self, type_tag: Optional[str] = None) -> int:
+        """代理数量（type_tag 为空时为全部类型）"""
+        if type_tag is None:
+            return len(self)
+        start, end = self._ranges[type_tag]
+        return end - start
+
+    def record(self, index: int) -> Dict:
+        """读取第 index 条记录"""
+        ip, port, type_code, country, asn, total_ms, score = SNAPSHOT_RECORD.unpack_from(
+            self._mm, SNAPSHOT_HEADER.size + index * SNAPSHOT_RECORD.size)
+        return {
+            "proxy": unpack_proxy(ip << 16 | port),
+            "type": SNAPSHOT_TYPES[type_code],
+            "country": country.rstrip(b"\0").decode("ascii") or None,
+            "asn": asn or None,
+            "total_ms": None if math.isnan(total_ms) else round(total_ms, 1),
+            "score": None if math.isnan(score) else round(score, 2)
+        }
+
+    def _key(self, index: int) -> int:
+        """内部方法：第 index 条记录的打包键（IPv4 << 16 | 端口）"""
+        ip, port = SNAPSHOT_KEY.unpack_from(self._mm, SNAPSHOT_HEADER.size + index * SNAPSHOT_RECORD.size)
+        return ip << 16 | port
+
+    def find(self, proxy: str) -> Optional[Dict]:
+        """按代理二分查找（每种类型的区间各查一次），不存在时返回 None"""
+        key = pack_proxy(proxy)
+        if key is None:
+            return None
+        for start, end in self._ranges.values():
+            low, high = start, end
+            while low < high:
+                middle = (low + high) // 2
+                if self._key(middle) < key:
+                    low = middle + 1
+                else:
+                    high = middle
+            if low < end and self._key(low) == key:
+                return self.record(low)
+        return None
+
+    def random(self, type_tag: Optional[str] = None) -> Optional[Dict]:
+        """随机取一条记录（type_tag 为空时在全部类型中随机），无代理时返回 None"""
+        start, end = (0, len(self)) if type_tag is None else self._ranges[type_tag]
+        return self.record(random.randrange(start, end)) if end > start else None
+
+    def sample(self, n: int, type_tag: Optional[str] = None) -> List[Dict]:
+        """随机取 n 条不重复的记录"""
+        start, end = (0, len(self)) if type_tag is None else self._ranges[type_tag]
+        return [self.record(index) for index in random.sample(range(start, end), min(n, end - start))]
+
+
+class ProxyDatabase:
+    """SQLite代理池：按类型/评分/最后验证时间建索引，每轮只写入变化的行（WAL模式，读写互不阻塞）"""
+
+    def __init__(self, filename: str = "proxy_pool.db"):
+        self.filename = filename
+        self._conn = sqlite3.connect(filename)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS proxies (
+                proxy TEXT PRIMARY KEY,
+                ip TEXT NOT NULL,
+                port INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                connect_ms REAL,
+                ttfb_ms REAL,
+                total_ms REAL,
+                score REAL,
+                last_checked REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_proxies_type ON proxies (type);
+            CREATE INDEX IF NOT EXISTS idx_proxies_score ON proxies (score DESC);
+            CREATE INDEX IF NOT EXISTS idx_proxies_last_checked ON proxies (last_checked);
+        """)
+        # 旧版本数据库补充归属列
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(proxies)")}
+        for column, column_type in (("country", "TEXT"), ("asn", "INTEGER"), ("as_name", "TEXT")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE proxies ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_proxies_country ON proxies (country)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_proxies_asn ON proxies (asn)")
+        self._conn.commit()
+
+    def save_round(self, normal_proxies: List[str], anonymous_proxies: List[str],
+                   metrics: Optional[Dict[str, Dict]] = None) -> Dict[str, int]:
+        """
+        同步一轮验证结果：新增/变化的行 upsert，未变化但本轮重新验证过的行只刷新验证时间，
+        未变化且未重新验证的行不写入，失效的行删除
+        :param metrics: 代理 -> 指标，checked_at 为该代理最后一次验证通过的时间（缺失时按未重新验证处理）
+        :return: 各类变更数量 {"inserted", "updated", "rechecked", "unchanged", "deleted"}
+        """
+        metrics = metrics or {}
+        now = time.time()
+        current = {row[0]: row[1:] for row in self._conn.execute(
+            "SELECT proxy, type, connect_ms, ttfb_ms, total_ms, score, country, asn, as_name, last_checked FROM proxies")}
+
+        upserts, rechecked = [], []
+        stats = {"inserted": 0, "updated": 0, "rechecked": 0, "unchanged": 0, "deleted": 0}
+        valid = {}
+        for type_tag, proxies in (("normal", normal_proxies), ("anonymous", anonymous_proxies)):
+            for proxy in proxies:
+                valid[proxy] = type_tag
+        for proxy, type_tag in valid.items():
+            entry = metrics.get(proxy, {})
+            values = (type_tag,) + tuple(entry.get(field) for field in METRIC_FIELDS + GEO_FIELDS)
+            checked_at = entry.get("checked_at")
+            old_row = current.get(proxy)
+            if old_row is not None and old_row[:-1] == values:
+                if checked_at and checked_at > old_row[-1]:
+                    rechecked.append((checked_at, proxy))
+                else:
+                    stats["unchanged"] += 1
+                continue
+            ip, _, port = proxy.partition(":")
+            upserts.append((proxy, ip, int(port)) + values + (checked_at or now,))
+            stats["inserted" if old_row is None else "updated"] += 1
+        deleted = [(proxy,) for proxy in current if proxy not in valid]
+        stats["rechecked"], stats["deleted"] = len(rechecked), len(deleted)
+
+        with self._conn:
+            self._conn.executemany("""
+                INSERT INTO proxies (proxy, ip, port, type, connect_ms, ttfb_ms, total_ms, score, country, asn, as_name,
+                                     last_checked)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (proxy) DO UPDATE SET
+                    type = excluded.type, connect_ms = excluded.connect_ms, ttfb_ms = excluded.ttfb_ms,
+                    total_ms = excluded.total_ms, score = excluded.score, country = excluded.country,
+                    asn = excluded.asn, as_name = excluded.as_name, last_checked = excluded.last_checked
+            """, upserts)
+            self._conn.executemany("UPDATE proxies SET last_checked = ? WHERE proxy = ?", rechecked)
+            self._conn.executemany("DELETE FROM proxies WHERE proxy = ?", deleted)
+        return stats
+
+    def query(self, type_tag: Optional[str] = None, limit: Optional[int] = None, country: Optional[str] = None,
+              asn: Optional[int] = None) -> List[Dict]:
+        """按评分从高到低查询代理（type_tag/country/asn 为空时不按该项过滤）"""
+        sql = "SELECT proxy, type, connect_ms, ttfb_ms, total_ms, score, country, asn, as_name, last_checked FROM proxies"
+        conditions, params = [], []
+        for column, value in (("type", type_tag), ("country", country), ("asn", asn)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY score DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        columns = ("proxy", "type") + METRIC_FIELDS + GEO_FIELDS + ("last_checked",)
+        return [dict(zip(columns, row)) for row in self._conn.execute(sql, params)]
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        self._conn.close()
+
+
+class ProxyChangeFeed:
+    """
+    代理池变更流：每轮把新增（add）/移除（remove）/评分或类型变化（rescore）的代理按序号追加到 NDJSON 文件，
+    并定期压缩为快照（快照记录其包含的最后序号，之后变更流从空文件重新开始）。
+    消费方先加载快照，再从快照序号之后逐行应用变更；发现变更流被替换（文件变短）或序号不连续时重新加载快照。
+    """
+
+    def __init__(self, filename: str = "proxy_changes.ndjson", snapshot_file: str = "proxy_snapshot.json",
+                 compact_events: int = 10000, compact_interval: float = 6 * 3600):
+        """
+        :param filename: 变更流文件（NDJSON，每行一个事件）
+        :param snapshot_file: 压缩快照文件
+        :param compact_events: 变更流事件数超过该值时压缩
+        :param compact_interval: 距上次快照超过该时长（秒）时压缩
+        """
+        self.filename = filename
+        self.snapshot_file = snapshot_file
+        self.compact_events = compact_events
+        self.compact_interval = compact_interval
+        self.seq, self.proxies = self.replay(snapshot_file, filename)  # 最后序号、当前代理 -> 类型与指标
+        self._snapshot_seq, self._snapshot_time = self._read_snapshot_header()
+        self._repair_tail()
+
+    @staticmethod
+    def read_changes(filename: str, after_seq: int = 0) -> List[Dict]:
+        """读取变更流中序号大于 after_seq 的事件（忽略写入中断留下的不完整末行）"""
+        events = []
+        if not os.path.exists(filename):
+            return events
+        with open(filename, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    break
+                if event["seq"] > after_seq:
+                    events.append(event)
+        return events
+
+    @staticmethod
+    def apply(proxies: Dict[str, Dict], event: Dict) -> None:
+        """把一个变更事件应用到代理字典（代理 -> 类型与指标）"""
+        if event["op"] == "remove":
+            proxies.pop(event["proxy"], None)
+        else:
+            proxies[event["proxy"]] = {key: value for key, value in event.items()
+                                       if key not in ("seq", "ts", "op", "proxy")}
+
+    @staticmethod
+    def replay(snapshot_file: str, filename: str) -> Tuple[int, Dict[str, Dict]]:
+        """加载快照并应用其后的变更，返回 (最后序号, 代理 -> 类型与指标)"""
+        seq, proxies = 0, {}
+        if os.path.exists(snapshot_file):
+            try:
+                with open(snapshot_file, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+                seq, proxies = snapshot["seq"], snapshot["proxies"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ [变更流] 快照加载失败，从变更流重建：{str(e)[:50]}")
+        for event in ProxyChangeFeed.read_changes(filename, seq):
+            ProxyChangeFeed.apply(proxies, event)
+            seq = event["seq"]
+        return seq, proxies
+
+    def _read_snapshot_header(self) -> Tuple[int, float]:
+        """内部方法：上次快照的序号与时间（无快照时为0）"""
+        try:
+            with open(self.snapshot_file, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            return snapshot["seq"], snapshot["snapshot_time"]
+        except (OSError, ValueError, KeyError):
+            return 0, 0.0
+
+    def _repair_tail(self) -> None:
+        """内部方法：截掉写入中断留下的不完整末行，避免后续追加的事件与其粘连"""
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def record_round(self, normal_proxies: List[str], anonymous_proxies: List[str],
+                     metrics: Optional[Dict[str, Dict]] = None) -> Dict[str, int]:
+        """
+        对比上一轮的代理池，追加本轮变更（到期时压缩为快照）
+        :return: 各类变更数量 {"add", "remove", "rescore"}
+        """
+        metrics = metrics or {}
+        now = time.time()
+        current = {}
+        for type_tag, proxies in (("normal", normal_proxies), ("anonymous", anonymous_proxies)):
+            for proxy in proxies:
+                current[proxy] = dict(metrics.get(proxy, {}), type=type_tag)
+
+        events, stats = [], {"add": 0, "remove": 0, "rescore": 0}
+        for proxy, entry in current.items():
+            old_entry = self.proxies.get(proxy)
+            if old_entry is None:
+                op = "add"
+            elif old_entry.get("type") != entry["type"] or old_entry.get("score") != entry.get("score"):
+                op = "rescore"
+            else:
+                continue
+            events.append(dict(entry, op=op, proxy=proxy))
+        events.extend({"op": "remove", "proxy": proxy} for proxy in self.proxies if proxy not in current)
+
+        lines = []
+        for event in events:
+            self.seq += 1
+            event = dict(event, seq=self.seq, ts=round(now, 3))
+            self.apply(self.proxies, event)
+            stats[event["op"]] += 1
+            lines.append(json.dumps(event, ensure_ascii=False, sort_keys=True))
+        if lines:
+            with open(self.filename, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+        if (self.seq - self._snapshot_seq > self.compact_events
+                or (self.seq > self._snapshot_seq and now - self._snapshot_time >= self.compact_interval)):
+            self.compact()
+        return stats
+
+    def compact(self) -> None:
+        """写入快照（包含到当前序号为止的全部变更），再清空变更流"""
+        now = time.time()
+        ProxyStorage.write_json_atomic(self.snapshot_file, {
+            "seq": self.seq,
+            "snapshot_time": now,
+            "update_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)),
+            "proxies": self.proxies
+        }, indent=None)
+        ProxyStorage.write_text_atomic(self.filename, "")
+        self._snapshot_seq, self._snapshot_time = self.seq, now
+        print(f"🗜️  [变更流] 已压缩为快照：{self.snapshot_file}（序号 {self.seq}，代理 {len(self.proxies)} 个）")
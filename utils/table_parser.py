@@ -0,0 +1,155 @@
+from html.parser import HTMLParser
+from typing import Dict, List
+
+CELL_TAGS = ("td", "th")
+SECTION_TAGS = ("tbody", "thead", "tfoot")
+TABLE_CONTEXT_TAGS = ("table", "section", "tr")  # 这些元素内（单元格外）的文本会被 html5lib 移到表格前
+RAW_TEXT_TAGS = ("script", "style")
+RCDATA_TAGS = ("textarea", "title", "xmp", "iframe", "noembed", "noframes")  # 内容按纯文本处理
+VOID_TAGS = ("area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source",
+             "track", "wbr")
+
+
+class _TableRowParser(HTMLParser):
+    """内部类：流式解析HTML，仅收集表格内 tr 下 td/th 的文本（按 html5lib 的表格构建规则）"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []  # 按文档顺序：{"td": [单元格...], "th": [...]}，单元格为 {"tag", "text"(文本片段), "marks"}
+        self._stack = []  # 打开的元素：[类型, 所属表格深度, 行/单元格/区块名/被移出表格的标签名]
+        self._table_depth = 0
+        self._raw_text = False  # 是否位于 script/style 内
+
+    def _find(self, kind: str, name: str = None) -> int:
+        """内部方法：在当前表格范围内查找打开的元素，返回栈下标（未找到为-1）"""
+        for i in range(len(self._stack) - 1, -1, -1):
+            open_kind, depth, obj = self._stack[i]
+            if open_kind == kind and depth == self._table_depth and (name is None or obj == name):
+                return i
+            if open_kind == "table":
+                return -1
+        return -1
+
+    def _close(self, kind: str, name: str = None) -> bool:
+        """内部方法：关闭当前表格范围内的指定元素及其内部元素"""
+        i = self._find(kind, name)
+        if i < 0:
+            return False
+        del self._stack[i:]
+        return True
+
+    def _open_section(self, name: str = "tbody") -> None:
+        """内部方法：打开 tbody/thead/tfoot（关闭同级的区块与行）"""
+        self._close("section")
+        self._stack.append(["section", self._table_depth, name])
+
+    def _open_row(self) -> None:
+        """内部方法：打开新行（缺少区块时按 html5lib 规则隐式补 tbody）"""
+        if not self._close("tr") and self._find("section") < 0:
+            self._open_section()
+        row = {"td": [], "th": []}
+        self.rows.append(row)
+        self._stack.append(["tr", self._table_depth, row])
+
+    def _clear_foster(self) -> None:
+        """内部方法：表格结构标签会关闭被移到表格前的元素（clear the stack back to a table context）"""
+        while self._stack and self._stack[-1][0] == "foster":
+            self._stack.pop()
+
+    def handle_starttag(self, tag, attrs):
+        if tag in RAW_TEXT_TAGS:
+            self._raw_text = True
+        elif tag in RCDATA_TAGS:
+            self.set_cdata_mode(tag)  # html.parser 默认仅对 script/style 如此处理
+        if tag == "table":
+            # 表格内（非单元格/标题中）出现 table：先关闭当前表格
+            if self._table_depth and self._find("cell") < 0 and self._find("caption") < 0:
+                self.handle_endtag("table")
+            # 记录嵌套表格在各外层单元格中的起始位置，用于承接被移出表格的文本
+            for kind, _, cell in self._stack:
+                if kind == "cell":
+                    cell["marks"].append(len(cell["text"]))
+            self._table_depth += 1
+            self._stack.append(["table", self._table_depth, None])
+        elif self._table_depth == 0:
+            return  # 表格外的 tr/td/th 会被 html5lib 忽略
+        elif tag not in SECTION_TAGS + CELL_TAGS + ("tr", "caption", "colgroup", "col"):
+            # 表格内单元格外的普通元素被移到表格之前，其中的文本同样如此
+            if self._stack[-1][0] in TABLE_CONTEXT_TAGS + ("foster",) and tag not in VOID_TAGS + RAW_TEXT_TAGS:
+                self._stack.append(["foster", self._table_depth, tag])
+            return
+
+        self._clear_foster()
+        self._close("caption")  # 标题内出现表格结构标签时先关闭标题
+        if tag in SECTION_TAGS:
+            self._open_section(tag)
+        elif tag == "caption":
+            self._close("section")
+            self._stack.append(["caption", self._table_depth, None])
+        elif tag in ("colgroup", "col"):
+            self._close("section")
+        elif tag == "tr":
+            self._open_row()
+        elif tag in CELL_TAGS:
+            self._close("cell")
+            if self._find("tr") < 0:
+                self._open_row()  # 单元格前缺少 tr 时隐式补全
+            cell = {"tag": tag, "text": [], "marks": []}
+            for kind, _, row in self._stack:
+                if kind == "tr":
+                    row[tag].append(cell)  # 外层行的 find_all 同样包含嵌套表格的单元格
+            self._stack.append(["cell", self._table_depth, cell])
+
+    def handle_endtag(self, tag):
+        if tag in RAW_TEXT_TAGS:
+            self._raw_text = False
+        elif self._stack and self._stack[-1][0] == "foster":
+            for i in range(len(self._stack) - 1, -1, -1):
+                if self._stack[i][0] != "foster":
+                    break
+                if self._stack[i][2] == tag:
+                    del self._stack[i:]
+                    return
+        if tag == "table" and self._table_depth:
+            self._close("table")
+            self._table_depth -= 1
+            for kind, _, cell in self._stack:
+                if kind == "cell":
+                    cell["marks"].pop()
+        elif tag == "caption" and self._table_depth:
+            self._close("caption")
+        elif tag in SECTION_TAGS and self._table_depth:
+            self._close("section", tag)
+        elif tag == "tr" and self._table_depth:
+            self._close("tr")
+        elif tag in CELL_TAGS and self._table_depth:
+            i = self._find("cell")
+            if i >= 0 and self._stack[i][2]["tag"] == tag:
+                del self._stack[i:]
+
+    def handle_data(self, data):
+        innermost = self._stack[-1][0] if self._stack else None
+        if innermost == "foster" or (innermost in TABLE_CONTEXT_TAGS and not self._raw_text
+                                     and data.strip(" \t\n\f")):
+            # 表格内单元格外的非空白文本被移到表格之前：插入各外层单元格中当前表格的起始位置
+            for kind, _, cell in self._stack:
+                if kind == "cell":
+                    cell["text"].insert(cell["marks"][-1], data)
+                    cell["marks"][-1] += 1
+            return
+        for kind, _, cell in self._stack:
+            if kind == "cell":
+                cell["text"].append(data)
+
+
+def extract_rows(html: str) -> List[Dict[str, List[str]]]:
+    """
+    提取HTML中所有表格行的单元格文本（与 BeautifulSoup(html, 'html5lib') 的
+    soup.find_all('tr') + tr.find_all('td'/'th')[i].text 结果一致）
+    :param html: 页面源码
+    :return: 按文档顺序的行列表，每行为 {"td": [单元格文本...], "th": [...]}
+    """
+    parser = _TableRowParser()
+    parser.feed(html.replace("\r\n", "\n").replace("\r", "\n"))
+    parser.close()
+    return [{tag: ["".join(cell["text"]) for cell in row[tag]] for tag in CELL_TAGS} for row in parser.rows]
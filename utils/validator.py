@@ -1,75 +1,293 @@
+import collections
+import json
+import queue
+import re
 import threading
-from typing import List
+import time
+from typing import Callable, List, Optional
 
 import requests
 
+from utils import metrics
+from utils.prefilter import TcpPrefilter
+
+# 会暴露“经过代理”的请求头（出现任一即非高匿）
+PROXY_HEADERS = ("via", "x-forwarded-for", "forwarded", "x-real-ip", "client-ip", "x-client-ip", "x-proxy-id",
+                 "proxy-connection", "x-forwarded-host", "x-forwarded-server", "x-originating-ip", "true-client-ip")
+IP_SEPARATORS = re.compile(r"[\s,;=\"]+")  # 拆分 origin 与 X-Forwarded-For/Via/Forwarded 等取值中的IP
+
+
+def _contains_ip(value: str, ip: str) -> bool:
+    """内部方法：取值按逗号/空白等拆分后是否有完整等于 ip 的一项（允许带端口或方括号，如 1.2.3.4:5678、[::1]）"""
+    for token in IP_SEPARATORS.split(value):
+        if token.strip("[]") == ip or token.rsplit(":", 1)[0].strip("[]") == ip:
+            return True
+    return False
+
+
+def classify_anonymity(text: str, real_ip: str) -> Optional[str]:
+    """
+    根据回显接口（返回 {"origin": 来源IP, "headers": {请求头}}，如 httpbin.org/get）的响应判断代理匿名度
+    :param text: 经代理请求回显接口得到的响应
+    :param real_ip: 本机出口IP
+    :return: transparent（暴露本机IP）/ anonymous（暴露使用了代理）/ elite（高匿）；响应不是回显格式时为 None
+    """
+    try:
+        data = json.loads(text)
+        headers = {str(name).lower(): str(value) for name, value in data["headers"].items()}
+        origin = str(data.get("origin", ""))
+    except (ValueError, KeyError, AttributeError, TypeError):
+        return None
+    if real_ip and (_contains_ip(origin, real_ip) or any(_contains_ip(value, real_ip) for value in headers.values())):
+        return "transparent"
+    if any(name in headers for name in PROXY_HEADERS):
+        return "anonymous"
+    return "elite"
+
+
+def detect_real_ip(echo_url: str, timeout: float = 10) -> Optional[str]:
+    """直连回显接口获取本机出口IP（失败时返回 None）"""
+    try:
+        origin = requests.get(echo_url, timeout=timeout).json()["origin"]
+        return str(origin).split(",")[0].strip()
+    except Exception as e:
+        print(f"⚠️ [匿名度检测] 获取本机出口IP失败：{str(e)[:50]}")
+        return None
+
 
 class ProxyValidator:
-    """代理IP验证类：多线程验证代理有效性"""
+    """代理IP验证类：TCP连接预筛 + 固定大小的工作线程池从共享队列中取代理做HTTP验证"""
 
-    def __init__(self, timeout: int = 10):
+    def __init__(self, timeout: int = 10, prefilter_timeout: float = 2.0, prefilter_concurrency: int = 1000,
+                 adaptive_percentile: Optional[float] = 0.95, adaptive_margin: float = 1.5, min_timeout: float = 1.0,
+                 adaptive_window: int = 500, adaptive_min_samples: int = 20):
+        """
+        :param timeout: HTTP验证超时时间（秒），也是自适应超时的上限
+        :param prefilter_timeout: TCP预筛连接超时（秒），为0时关闭预筛
+        :param prefilter_concurrency: TCP预筛最大并发连接数
+        :param adaptive_percentile: 自适应超时取最近成功验证耗时的该分位数（乘以 adaptive_margin），为空时固定使用 timeout
+        :param adaptive_margin: 自适应超时的余量系数
+        :param min_timeout: 自适应超时的下限（秒）
+        :param adaptive_window: 参与计算的最近成功验证数（跨轮次保留）
+        :param adaptive_min_samples: 成功样本少于该数时仍使用 timeout
+        """
         self.valid_proxies = []  # 存储有效代理
+        self.results = {}  # 有效代理 -> 耗时指标（connect_ms/ttfb_ms/total_ms）与匿名度（anonymity）
+        self.cancelled_proxies = []  # 本轮结果未知的代理（时间预算用尽或被自适应超时截断，不应计为失败）
+        self.expired_count = 0  # 其中被自适应超时截断的验证数
         self.timeout = timeout  # 代理验证超时时间
+        self.adaptive_percentile = adaptive_percentile
+        self.adaptive_margin = adaptive_margin
+        self.min_timeout = min_timeout
+        self.adaptive_min_samples = adaptive_min_samples
+        self._latencies = collections.deque(maxlen=adaptive_window)  # 最近成功验证的总耗时（秒）
+        self._latency_lock = threading.Lock()
+        self._adaptive_timeout = None  # 当前自适应超时（样本不足时为空）
+        self._unseeded = set()  # 耗时不计入自适应超时样本的代理（如复检的已知有效代理，耗时偏低）
+        self._deadline = None  # 本轮验证截止时间（time.monotonic()，未设置预算时为空）
         # 验证请求头
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/87.0.4280.88 Safari/537.36"
         }
+        self._queue = queue.Queue()  # 待验证代理队列
+        self._workers = []  # 工作线程（数量固定，不随代理数增长）
+        self._prefilter = TcpPrefilter(prefilter_timeout, prefilter_concurrency) if prefilter_timeout else None
+        self.real_ip = None  # 本机出口IP，设置后验证请求的响应按回显格式判断匿名度
+
+    def enable_anonymity_check(self, echo_url: str) -> bool:
+        """开启匿名度检测：此后 test_url 需为回显接口，验证通过的代理在 results 中带 anonymity 字段"""
+        self.real_ip = detect_real_ip(echo_url, self.timeout)
+        return self.real_ip is not None
+
+    def current_timeout(self) -> float:
+        """当前HTTP验证超时：成功样本足够时为自适应超时，否则为 timeout"""
+        return self._adaptive_timeout or self.timeout
+
+    def _record_latency(self, total: float) -> None:
+        """内部方法：记录一次成功验证的耗时，按分位数更新自适应超时"""
+        if not self.adaptive_percentile:
+            return
+        with self._latency_lock:
+            self._latencies.append(total)
+            if len(self._latencies) < self.adaptive_min_samples:
+                return
+            samples = sorted(self._latencies)
+            cutoff = samples[min(len(samples) - 1, int(len(samples) * self.adaptive_percentile))]
+            self._adaptive_timeout = round(min(self.timeout, max(self.min_timeout, cutoff * self.adaptive_margin)), 3)
+        metrics.CHECK_TIMEOUT_SECONDS.set(self._adaptive_timeout)
+
+    def _remaining(self) -> Optional[float]:
+        """内部方法：本轮验证剩余时间预算（秒，未设置预算时为空）"""
+        return None if self._deadline is None else self._deadline - time.monotonic()
+
+    def _cancel(self, proxy: str) -> None:
+        """内部方法：记录因时间预算用尽而取消的验证"""
+        self.cancelled_proxies.append(proxy)
+        metrics.CHECKS.inc(result="cancelled")
 
-    def check_proxy(self, proxy: str, test_url: str, keyword: str, encoding: str = "utf-8"):
+    def check_proxy(self, proxy: str, test_url: str, keyword: str, encoding: str = "utf-8",
+                    connect_time: Optional[float] = None, timeout: Optional[float] = None) -> bool:
         """
-        验证单个代理有效性
+        验证单个代理有效性，有效时记录耗时指标（开启匿名度检测时同一请求判断匿名度）
         :param proxy: 待验证代理（IP:PORT）
         :param test_url: 测试URL
         :param keyword: 验证成功关键词
         :param encoding: 页面编码
+        :param connect_time: TCP预筛测得的连接耗时（秒，未预筛时为None）
+        :param timeout: 本次验证超时（秒），为空时取 current_timeout()
+        :return: 是否有效
         """
+        metrics.CHECKS_IN_FLIGHT.inc()
+        start_time = time.perf_counter()
         try:
             proxy_config = {"http": proxy, "https": proxy}
             response = requests.get(
                 test_url,
                 headers=self.headers,
                 proxies=proxy_config,
-                timeout=self.timeout,
+                timeout=timeout or self.current_timeout(),
                 allow_redirects=False,  # 禁止重定向，提高验证准确性
-                verify=False  # 忽略SSL证书错误
+                verify=False,  # 忽略SSL证书错误
+                stream=True  # 收到响应头即返回，便于分别统计首字节与总耗时
             )
+            ttfb = time.perf_counter() - start_time
             response.encoding = encoding
-            if keyword in response.text:
+            text = response.text
+            total = time.perf_counter() - start_time
+            anonymity = classify_anonymity(text, self.real_ip) if self.real_ip is not None else None
+            if keyword in text and (self.real_ip is None or anonymity):
+                self.results[proxy] = {
+                    "connect_ms": round(connect_time * 1000, 1) if connect_time is not None else None,
+                    "ttfb_ms": round(ttfb * 1000, 1),
+                    "total_ms": round(total * 1000, 1),
+                    "anonymity": anonymity
+                }
                 self.valid_proxies.append(proxy)
+                metrics.CHECKS.inc(result="valid")
+                metrics.CHECK_SECONDS.observe(total, result="valid")
+                metrics.CHECK_TTFB_SECONDS.observe(ttfb)
+                if proxy not in self._unseeded:
+                    self._record_latency(total)
+                return True
         except:
             # 验证失败（超时/连接错误/关键词不匹配）不做处理
             pass
+        finally:
+            metrics.CHECKS_IN_FLIGHT.dec()
+        metrics.CHECKS.inc(result="invalid")
+        metrics.CHECK_SECONDS.observe(time.perf_counter() - start_time, result="invalid")
+        return False
 
-    def validate(self, proxies: List[str], test_url: str, keyword: str, thread_count: int = 500) -> List[str]:
+    def _worker(self, test_url: str, keyword: str, on_valid: Optional[Callable[[str], None]]) -> None:
+        """内部方法：工作线程循环取队列中的 (代理, 连接耗时) 验证，收到 None 时退出"""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                proxy, connect_time = item
+                timeout, remaining = self.current_timeout(), self._remaining()
+                if remaining is not None:
+                    if remaining <= 0:
+                        self._cancel(proxy)  # 时间预算已用尽：丢弃排队中的代理
+                        continue
+                    timeout = min(timeout, remaining)  # 进行中的验证最晚在截止时间结束
+                start_time = time.monotonic()
+                if self.check_proxy(proxy, test_url, keyword, connect_time=connect_time, timeout=timeout):
+                    if on_valid:
+                        on_valid(proxy)
+                elif remaining is not None and self._remaining() <= 0:
+                    self.cancelled_proxies.append(proxy)  # 因截止时间被中断，结果未知
+                elif timeout < self.timeout and time.monotonic() - start_time >= timeout:
+                    # 被低于 timeout 的自适应超时截断：可能只是较慢，结果未知，不计为失败（否则历史退避会误伤）
+                    with self._latency_lock:
+                        self.expired_count += 1
+                    self.cancelled_proxies.append(proxy)
+            finally:
+                self._queue.task_done()
+
+    def start(self, test_url: str, keyword: str, thread_count: int = 500,
+              on_valid: Optional[Callable[[str], None]] = None, budget: Optional[float] = None) -> None:
         """
-        批量验证代理IP（多线程）
-        :param proxies: 待验证代理列表
+        启动验证工作线程池
         :param test_url: 测试URL
         :param keyword: 验证成功关键词
-        :param thread_count: 单次最大线程数
-        :return: 有效代理列表
+        :param thread_count: 工作线程数（即最大并发验证数）
+        :param on_valid: 代理验证通过时的回调（在工作线程中调用）
+        :param budget: 本轮验证的时间预算（秒，从启动时计算），用尽后取消未完成的验证；为空时不限制
         """
-        threads = []
         self.valid_proxies.clear()
+        self.results.clear()
+        self.cancelled_proxies.clear()
+        self.expired_count = 0
+        self._unseeded.clear()
+        self._deadline = time.monotonic() + budget if budget is not None else None
+        self._workers = [
+            threading.Thread(target=self._worker, args=(test_url, keyword, on_valid), daemon=True)
+            for _ in range(max(1, thread_count))
+        ]
+        for t in self._workers:
+            t.start()
+        if self._prefilter:
+            # 仅TCP可连通的代理进入HTTP验证队列
+            self._prefilter.start(lambda proxy, connect_time: self._queue.put((proxy, connect_time)))
+
+    def submit(self, proxy: str, seed: bool = True) -> None:
+        """
+        提交单个代理（线程安全；开启预筛时先做TCP探测，否则直接进入验证队列）
+        :param proxy: 待验证代理（IP:PORT）
+        :param seed: 验证通过时耗时是否计入自适应超时样本（复检的已知有效代理应为 False）
+        """
+        if not seed:
+            self._unseeded.add(proxy)
+        if self._prefilter:
+            self._prefilter.submit(proxy)
+        else:
+            self._queue.put((proxy, None))
 
+    def finish(self) -> List[str]:
+        """等待队列中的代理全部验证完毕并回收工作线程，返回有效代理列表"""
+        if self._prefilter:
+            remaining = self._remaining()
+            for proxy in self._prefilter.finish(None if remaining is None else max(0.0, remaining)):
+                self._cancel(proxy)  # 截止时还未完成TCP探测
+            print(f"ℹ️  TCP预筛 | 探测：{self._prefilter.probed_count}个 | 可连通：{self._prefilter.reachable_count}个")
+        for _ in self._workers:
+            self._queue.put(None)
+        for t in self._workers:
+            t.join()
+        self._workers = []
+        if len(self.cancelled_proxies) > self.expired_count:
+            print(f"⏱️  验证时间预算用尽，取消未完成的验证：{len(self.cancelled_proxies) - self.expired_count}个")
+        if self.expired_count:
+            print(f"⏱️  自适应超时（{self.current_timeout()}秒）截断的验证：{self.expired_count}个（结果未知，不计为失败）")
+        return self.valid_proxies
+
+    def validate(self, proxies: List[str], test_url: str, keyword: str, thread_count: int = 500,
+                 budget: Optional[float] = None, unseeded: Optional[List[str]] = None) -> List[str]:
+        """
+        批量验证代理IP（线程池 + 共享队列，无批次等待）
+        :param proxies: 待验证代理列表
+        :param test_url: 测试URL
+        :param keyword: 验证成功关键词
+        :param thread_count: 最大并发验证数
+        :param budget: 时间预算（秒），用尽后取消未完成的验证（记入 cancelled_proxies）
+        :param unseeded: 其中耗时不计入自适应超时样本的代理（如复检的已知有效代理）
+        :return: 有效代理列表
+        """
         if not proxies:
+            self.valid_proxies.clear()
+            self.results.clear()
+            self.cancelled_proxies.clear()
             print("⚠️ 无待验证的代理IP")
             return []
 
-        # 分批次启动线程（避免线程数过多）
-        for batch_start in range(0, len(proxies), thread_count):
-            batch_proxies = proxies[batch_start:batch_start + thread_count]
-            for proxy in batch_proxies:
-                t = threading.Thread(
-                    target=self.check_proxy,
-                    args=(proxy, test_url, keyword)
-                )
-                threads.append(t)
-                t.start()
-
-            # 等待当前批次线程完成
-            for t in threads[batch_start:batch_start + thread_count]:
-                t.join()
+        # 线程数不超过代理数，避免空转线程
+        self.start(test_url, keyword, min(thread_count, len(proxies)), budget=budget)
+        unseeded = set(unseeded or ())
+        for proxy in proxies:
+            self.submit(proxy, proxy not in unseeded)
+        self.finish()
 
         print(f"✅ 验证完成 | 有效代理：{len(self.valid_proxies)}个（总待验证：{len(proxies)}个）")
         return self.valid_proxies